@@ -0,0 +1,193 @@
+"""
+Local stand-in for the Amul products API.
+
+Serves a synthetic catalog per pincode with the same query shape, paging and
+response envelope as the real endpoint, plus knobs for catalog size,
+response latency, error injection and stock churn between polls.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+API_PATH = "/api/1/entity/ms.products"
+
+
+class FakeCatalog:
+    """Synthetic products per pincode whose stock changes between polls.
+
+    Args:
+        products: Products listed in every category
+        churn: Fraction of products whose stock changes on every poll
+        seed: Random seed, so runs are comparable
+    """
+
+    def __init__(self, products: int = 500, churn: float = 0.02, seed: int = 1):
+        self.products = products
+        self.churn = churn
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stock: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _items(self, pincode: str) -> List[Dict[str, Any]]:
+        """Return the pincode's catalog, creating it on first use; caller holds the lock."""
+        items = self._stock.get(pincode)
+        if items is None:
+            items = []
+            for i in range(self.products):
+                available = self._random.random() < 0.5
+                items.append(
+                    {
+                        "_id": f"{i:024x}",
+                        "name": f"Amul Protein Product {i}",
+                        "alias": f"amul-protein-product-{i}",
+                        "available": 1 if available else 0,
+                        "inventory_quantity": self._random.randint(1, 50) if available else 0,
+                        "price": 100 + i % 400,
+                        "brand": "Amul",
+                    }
+                )
+            self._stock[pincode] = items
+        return items
+
+    def tick(self, pincode: str) -> None:
+        """Flip the stock of a churn-sized random sample of products."""
+        with self._lock:
+            items = self._items(pincode)
+            for item in self._random.sample(items, int(len(items) * self.churn)):
+                if item["available"]:
+                    item["available"] = 0
+                    item["inventory_quantity"] = 0
+                else:
+                    item["available"] = 1
+                    item["inventory_quantity"] = self._random.randint(1, 50)
+
+    def page(
+        self, pincode: str, start: int, limit: int, fields: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """Return one page in the API's response envelope."""
+        with self._lock:
+            items = self._items(pincode)
+            selected = items[start:start + limit]
+            if fields:
+                keep = set(fields) | {"_id"}
+                selected = [{k: v for k, v in item.items() if k in keep} for item in selected]
+            else:
+                selected = [dict(item) for item in selected]
+        return {
+            "data": selected,
+            "paging": {"limit": limit, "start": start, "total": len(items)},
+        }
+
+
+class FakeAmulServer:
+    """Threaded HTTP server mimicking the products endpoint.
+
+    Requests must carry a ``pincode`` cookie, like a real session bound to a
+    pincode. Each request to the first page advances that pincode's stock.
+
+    Args:
+        catalog: Catalog to serve
+        latency_ms: Delay added to every response
+        error_rate: Fraction of requests answered with HTTP 503
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+    """
+
+    def __init__(
+        self,
+        catalog: FakeCatalog,
+        latency_ms: float = 0,
+        error_rate: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.catalog = catalog
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(2)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        """Products endpoint URL to use as API_BASE_URL."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real CDN
+
+            def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                if url.path != API_PATH:
+                    self._reply(404, {"error": "not found"})
+                    return
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                if server._should_fail():
+                    self._reply(503, {"error": "injected failure"})
+                    return
+
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                if "pincode" not in cookie:
+                    self._reply(401, {"error": "session has no pincode"})
+                    return
+                pincode = cookie["pincode"].value
+
+                query = parse_qs(url.query)
+                start = int(query.get("start", ["0"])[0])
+                limit = int(query.get("limit", ["24"])[0])
+                fields = [
+                    key[len("fields["):-1] for key in query if key.startswith("fields[")
+                ]
+                if start == 0:
+                    server.catalog.tick(pincode)
+                self._reply(200, server.catalog.page(pincode, start, limit, fields))
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        """Serve on a daemon thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-amul", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
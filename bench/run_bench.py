@@ -0,0 +1,201 @@
+"""
+Offline benchmark for the get_amul_data -> update_db_and_notify path.
+
+Starts a fake Amul API and an SMTP sink on localhost, points the app at them,
+and runs N pincodes x M products for a number of cycles through the real
+API client, session pool, fingerprinting, SQLite and notification queue.
+Reports throughput, per-check latency percentiles and peak RSS.
+
+Usage (from the repository root):
+    python bench/run_bench.py --pincodes 20 --products 500 --cycles 5
+    python bench/run_bench.py --latency-ms 80 --error-rate 0.02 --json bench_output.txt
+
+The Playwright fallback is not exercised: a check whose pooled sessions all
+fail is counted as an error instead of launching a browser.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from fake_amul import FakeAmulServer, FakeCatalog
+from smtp_sink import SMTPSink
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pincodes", type=int, default=10, help="Pincodes to poll")
+    parser.add_argument("--products", type=int, default=500, help="Products per pincode")
+    parser.add_argument("--cycles", type=int, default=5, help="Passes over every pincode")
+    parser.add_argument("--workers", type=int, default=8, help="Pincodes checked at once")
+    parser.add_argument("--page-size", type=int, default=24, help="Products per API page")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Fake API latency")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of API requests that fail"
+    )
+    parser.add_argument(
+        "--churn", type=float, default=0.02, help="Fraction of products changing per poll"
+    )
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    return parser.parse_args()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of this process in megabytes."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    catalog = FakeCatalog(products=args.products, churn=args.churn)
+    api = FakeAmulServer(catalog, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    sink = SMTPSink()
+    api.start()
+    sink.start()
+    workdir = tempfile.mkdtemp(prefix="amul-bench-")
+
+    # The app reads these at import time, so set them before importing it
+    os.environ.update(
+        {
+            "API_BASE_URL": api.api_url,
+            "API_PAGE_SIZE": str(args.page_size),
+            "CATEGORIES": "protein",
+            "MAX_WORKERS": str(args.workers),
+            "HTTP_POOL_MAXSIZE": str(args.workers * 2),
+            "EMAIL_ENABLED": "True",
+            "EMAIL_FROM": "bench@localhost",
+            "EMAIL_PASSWORD": "bench",
+            "EMAIL_TO": "alerts@localhost",
+            "SMTP_SERVER": sink.address[0],
+            "SMTP_PORT": str(sink.address[1]),
+            "SMTP_STARTTLS": "False",
+            "SESSION_HARVESTER_ENABLED": "False",
+            "METRICS_ENABLED": "False",
+        }
+    )
+    sys.path.insert(0, SRC_DIR)
+    import config
+
+    config.DB_PATH = os.path.join(workdir, "bench.db")
+    config.SESSION_DIR = os.path.join(workdir, "sessions")
+    config.OUTBOX_DIR = os.path.join(workdir, "outbox")
+
+    import scraper
+    from api_client import api_client
+    from db import close_db, init_db, update_db_and_notify
+    from fingerprint import UNCHANGED, fingerprints
+    from logger import default_logger
+    from notification import notification_queue
+    from session_pool import get_session_pool
+
+    default_logger.setLevel(logging.WARNING)
+    # Count fallbacks instead of launching a browser against the fake API
+    scraper.scrape_amul_data = lambda pincode, category=None: []
+
+    pincodes = [f"{110001 + i}" for i in range(args.pincodes)]
+
+    def ensure_session(pincode: str) -> None:
+        """Stand in for the harvester: keep one usable session per pincode."""
+        pool = get_session_pool(pincode)
+        if not pool.usable_count():
+            pool.add(
+                {"user-agent": "amul-bench"},
+                [{"name": "pincode", "value": pincode, "expires": -1}],
+            )
+
+    def check(pincode: str) -> float:
+        ensure_session(pincode)
+        started = time.perf_counter()
+        items = scraper.get_amul_data(pincode)
+        if items is not UNCHANGED:
+            if not items:
+                raise RuntimeError(f"No data for pincode {pincode}")
+            update_db_and_notify(items, pincode)
+        return time.perf_counter() - started
+
+    init_db()
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for _ in range(args.cycles):
+            futures = [executor.submit(check, pincode) for pincode in pincodes]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    errors += 1
+    elapsed = time.perf_counter() - started
+
+    # Measure how long the queued email takes to reach the sink
+    drain_started = time.perf_counter()
+    while notification_queue.depth() and time.perf_counter() - drain_started < 60:
+        time.sleep(0.05)
+    drain_seconds = time.perf_counter() - drain_started
+    notification_queue.stop()
+    close_db()
+    api.stop()
+    sink.stop()
+
+    checks = len(latencies) + errors
+    connections = api_client.connection_stats()
+    return {
+        "pincodes": args.pincodes,
+        "products": args.products,
+        "cycles": args.cycles,
+        "checks": checks,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "cycles_per_second": round(args.cycles / elapsed, 3) if elapsed else 0.0,
+        "checks_per_second": round(checks / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "latency_max_ms": round(max(latencies, default=0.0) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "api_requests": api.requests,
+        "api_errors_injected": api.errors,
+        "http_new_connections": connections["new_connections"],
+        "fetch_cycles_skipped": fingerprints.snapshot()["cycles_skipped"],
+        "emails_delivered": sink.messages,
+        "notification_drain_seconds": round(drain_seconds, 3),
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    report = run(args)
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        print(f"{key.ljust(width)}  {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Local SMTP sink for benchmarks.
+
+Speaks just enough SMTP for smtplib (EHLO, AUTH, MAIL, RCPT, DATA, NOOP,
+RSET, QUIT), accepts any credentials, and counts delivered messages instead
+of relaying them. STARTTLS is not offered, so run the app with
+SMTP_STARTTLS=False against it.
+"""
+
+import socketserver
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+class SMTPSink:
+    """Threaded SMTP server that swallows every message.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.messages = 0
+        self.recipients = 0
+        self.received_at: List[float] = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """The (host, port) the sink listens on."""
+        return self._server.server_address[:2]
+
+    def _record(self, recipients: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.recipients += recipients
+            self.received_at.append(time.monotonic())
+
+    def _handler(self):
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _send(self, line: str) -> None:
+                self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+            def handle(self) -> None:
+                self._send("220 smtp-sink ready")
+                recipients = 0
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode("utf-8", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+
+                    if verb == "EHLO":
+                        self._send("250-smtp-sink")
+                        self._send("250-AUTH PLAIN LOGIN")
+                        self._send("250 8BITMIME")
+                    elif verb == "HELO":
+                        self._send("250 smtp-sink")
+                    elif verb == "AUTH":
+                        self._send("235 2.7.0 Authentication successful")
+                    elif verb == "MAIL":
+                        recipients = 0
+                        self._send("250 OK")
+                    elif verb == "RCPT":
+                        recipients += 1
+                        self._send("250 OK")
+                    elif verb == "DATA":
+                        self._send("354 End data with <CR><LF>.<CR><LF>")
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in (b".\r\n", b".\n"):
+                                break
+                        sink._record(recipients)
+                        self._send("250 OK queued")
+                    elif verb in ("NOOP", "RSET"):
+                        self._send("250 OK")
+                    elif verb == "QUIT":
+                        self._send("221 Bye")
+                        return
+                    else:
+                        self._send("502 Command not implemented")
+
+        return Handler
+
+    def start(self) -> None:
+        """Serve on a daemon thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="smtp-sink", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -1,117 +1,361 @@
+import threading
 import requests
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from typing import List, Dict, Any, Optional, Tuple
 import config
+from capture import record_capture
+from fingerprint import UNCHANGED, FetchResult, fingerprints, payload_hasher
 from logger import default_logger as logger
-from session_storage import session_storage
+from metrics import http_new_connections, http_requests, stage_seconds
+from product import Product, ProductStreamParser
+from products_query import build_products_url
+from session_pool import PooledSession, get_session_pool
 
+# Bytes read from the socket at a time when streaming a products response
+RESPONSE_CHUNK_SIZE = 64 * 1024
 
-class AmulApiClient:
-    """Client for making direct API calls to Amul using saved session data."""
+
+class ConnectionStats:
+    """Thread-safe counters for requests sent and connections opened per host."""
 
     def __init__(self):
-        self.timeout = 30
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.new_connections: Dict[str, int] = {}
 
-    def _prepare_cookies_dict(self, cookies: List[Dict[str, Any]]) -> Dict[str, str]:
-        """Convert Playwright cookies to requests-compatible format.
+    def record_request(self, host: str) -> None:
+        """Count a request sent to a host."""
+        with self._lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
 
-        Args:
-            cookies: List of cookie dictionaries from Playwright
+    def record_new_connection(self, host: str) -> None:
+        """Count a fresh TCP/TLS connection opened to a host."""
+        with self._lock:
+            self.new_connections[host] = self.new_connections.get(host, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return totals and per-host request/connection/reuse figures."""
+        with self._lock:
+            hosts = {}
+            for host, sent in self.requests.items():
+                opened = self.new_connections.get(host, 0)
+                hosts[host] = {
+                    "requests": sent,
+                    "new_connections": opened,
+                    "reused": max(0, sent - opened),
+                }
+        total_requests = sum(h["requests"] for h in hosts.values())
+        total_reused = sum(h["reused"] for h in hosts.values())
+        return {
+            "requests": total_requests,
+            "new_connections": sum(h["new_connections"] for h in hosts.values()),
+            "reused": total_reused,
+            "reuse_ratio": total_reused / total_requests if total_requests else 0.0,
+            "hosts": hosts,
+        }
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that records how often pooled connections are reused."""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _new_conn(self):
+                    stats.record_new_connection(self.host)
+                    return super()._new_conn()
+
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting(HTTPConnectionPool),
+            "https": counting(HTTPSConnectionPool),
+        }
+
+    def send(self, request, *args, **kwargs):
+        self.stats.record_request(urlsplit(request.url).hostname or "")
+        return super().send(request, *args, **kwargs)
+
+
+class AmulApiClient:
+    """Client for making direct API calls to Amul using saved session data.
+
+    Requests go through per-thread ``requests.Session`` objects that share one
+    pooled adapter, so keep-alive connections are reused across pincodes and
+    worker threads instead of paying a TCP+TLS handshake on every call. The
+    sessions never store cookies: each request carries only the cookies of
+    the pincode's own saved session.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize: int = config.HTTP_POOL_MAXSIZE,
+    ):
+        self.timeout = config.HTTP_TIMEOUT
+        self.stats = ConnectionStats()
+        self._adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=False,
+        )
+        self._local = threading.local()
+        self._page_executor = ThreadPoolExecutor(
+            max_workers=config.PAGE_FETCH_WORKERS, thread_name_prefix="page"
+        )
+
+    def _get_session(self) -> requests.Session:
+        """Return this thread's session, creating it on first use."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            # One session serves many pincodes, so never keep Set-Cookie values
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _get(
+        self, url: str, headers: Dict[str, str], cookies: Dict[str, str], timeout: float
+    ):
+        """Send a streamed GET for the products API over the pooled transport."""
+        request_headers = dict(headers)
+        # Always ask for a compressed body, whatever the saved headers say
+        request_headers["Accept-Encoding"] = "gzip, deflate"
+        return self._get_session().get(
+            url,
+            headers=request_headers,
+            cookies=cookies,
+            timeout=timeout,
+            stream=True,
+        )
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Return request and connection reuse counters for the pooled transport.
 
         Returns:
-            Dictionary of cookie name-value pairs for requests
+            Dictionary with total and per-host requests, new connections and reuses
         """
-        cookies_dict = {}
-        for cookie in cookies:
-            if "name" in cookie and "value" in cookie:
-                cookies_dict[cookie["name"]] = cookie["value"]
-        return cookies_dict
+        return self.stats.snapshot()
+
+    def _request_page(
+        self, pincode: str, session: PooledSession, url: str, timeout: float
+    ) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """Send one products request and judge the session from its response.
 
-    def fetch_products(self, pincode: str) -> Optional[List[Dict[str, Any]]]:
-        """Fetch products directly from the API using saved session data.
+        The response doubles as the session check: a 200 with a ``data`` key
+        marks the session healthy, while a rejection or an unusable body counts
+        against it; server errors, throttling and network failures do not. The
+        body is hashed and decoded chunk by chunk as it arrives, each product
+        straight into a Product record, so it is never held in memory whole.
+        A body identical to the previous one for this URL returns the cached
+        products and its decoded copy is dropped.
 
         Args:
-            pincode: The pincode to filter products for
+            pincode: The pincode the session belongs to
+            session: Pooled session whose headers and cookies are sent
+            url: Products API URL for the page to fetch
+            timeout: Request timeout in seconds
 
         Returns:
-            List of product dictionaries or None if failed
+            Tuple of (response body with ``data`` as a list of Products, True if
+            the body was unchanged), or None if failed
         """
-        # Load saved session data
-        saved_headers = session_storage.load_headers()
-        saved_cookies = session_storage.load_cookies()
-
-        if not saved_headers or not saved_cookies:
-            logger.warning("No saved session data available for direct API call")
-            return None
-
         try:
-            logger.info(f"Making direct API call for pincode: {pincode}")
-
-            # Convert cookies to requests format
-            cookies_dict = self._prepare_cookies_dict(saved_cookies)
+            # Make the API request over a pooled keep-alive connection
+            response = self._get(url, session.headers, session.cookie_dict, timeout)
+            try:
+                if response.status_code != 200:
+                    # Server errors and throttling are upstream trouble, not
+                    # a sign that the session went bad
+                    if response.status_code < 500 and response.status_code != 429:
+                        session.health.record_failure()
+                    logger.warning(
+                        f"Direct API call rejected for pincode {pincode} - status: {response.status_code}"
+                    )
+                    return None
+                # Decode only the tracked product fields while the body arrives
+                hasher = payload_hasher()
+                parser = ProductStreamParser()
+                for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+                    hasher.update(chunk)
+                    parser.feed(chunk)
+            finally:
+                response.close()
 
-            # Make the API request using requests
-            response = requests.get(
-                config.API_URL,
-                headers=saved_headers,
-                cookies=cookies_dict,
-                timeout=self.timeout,
-            )
-            response.raise_for_status()
+            # Hand back the cached products when the body matches the last one
+            digest = hasher.digest()
+            cached = fingerprints.cached_page(pincode, url, digest)
+            if cached is not None:
+                session.health.record_success()
+                return cached, True
 
-            # Parse response
-            data = response.json()
-            products = data.get("data", [])
+            data = parser.close()
+            if not isinstance(data.get("data"), list):
+                session.health.record_failure()
+                logger.warning(f"Direct API response for pincode {pincode} has no data")
+                return None
 
-            logger.info(
-                f"Direct API call successful - retrieved {len(products)} products"
-            )
-            return products
+            fingerprints.store_page(pincode, url, digest, data)
+            session.health.record_success()
+            return data, False
 
         except requests.exceptions.RequestException as e:
+            # Timeouts and dropped connections say nothing about the session
             logger.error(f"Direct API call failed: {e}")
             return None
         except Exception as e:
+            session.health.record_failure()
             logger.error(f"Error processing API response: {e}")
             return None
 
-    def validate_session(self) -> bool:
-        """Validate if the current session data is still working.
+    @staticmethod
+    def _total_count(payload: Dict[str, Any]) -> Optional[int]:
+        """Return the catalog size reported by a response, if any."""
+        paging = payload.get("paging")
+        total = paging.get("total") if isinstance(paging, dict) else payload.get("total")
+        try:
+            return int(total) if total is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _fetch_categories(
+        self,
+        pincode: str,
+        session: PooledSession,
+        categories: List[str],
+        profile: Optional[str],
+    ) -> FetchResult:
+        """Fetch every page of every category, two round-trips deep.
+
+        First pages of all categories go out together; once their totals are
+        known the remaining pages are fetched concurrently as well.
 
         Returns:
-            bool: True if session is valid, False otherwise
+            Merged products, UNCHANGED if every page matched its previous
+            response, or None if any page failed
         """
-        # Load saved session data
-        saved_headers = session_storage.load_headers()
-        saved_cookies = session_storage.load_cookies()
+        page_size = config.API_PAGE_SIZE
 
-        if not saved_headers or not saved_cookies:
-            return False
+        def fetch(category: str, start: int) -> Optional[Tuple[Dict[str, Any], bool]]:
+            url = build_products_url(category, start, page_size, profile)
+            return self._request_page(pincode, session, url, self.timeout)
 
-        try:
-            # Convert cookies to requests format
-            cookies_dict = self._prepare_cookies_dict(saved_cookies)
-
-            # Make a lightweight test request using requests
-            response = requests.get(
-                config.API_URL, headers=saved_headers, cookies=cookies_dict, timeout=10
-            )
-
-            # Check if we get a valid response
-            if response.status_code == 200:
-                data = response.json()
-                if "data" in data:
-                    logger.info("Session validation successful")
-                    return True
-
-            logger.warning(
-                f"Session validation failed - status: {response.status_code}"
-            )
-            return False
+        first_results = list(
+            self._page_executor.map(lambda c: fetch(c, 0), categories)
+        )
+        if any(result is None for result in first_results):
+            return None
+        first_pages = [page for page, _ in first_results]
 
-        except Exception as e:
-            logger.warning(f"Session validation failed: {e}")
-            return False
+        pending = []
+        for category, page in zip(categories, first_pages):
+            total = self._total_count(page)
+            if total is None:
+                # No total reported; assume more only if the page came back full
+                total = page_size + 1 if len(page["data"]) >= page_size else 0
+            for start in range(page_size, total, page_size):
+                pending.append((category, start))
+
+        more_results = list(self._page_executor.map(lambda job: fetch(*job), pending))
+        if any(result is None for result in more_results):
+            return None
+        if all(unchanged for _, unchanged in first_results + more_results):
+            return UNCHANGED
+        more_pages = [page for page, _ in more_results]
+
+        # Merge pages in order and drop products listed more than once
+        products: List[Product] = []
+        seen = set()
+        for page in first_pages + more_pages:
+            for product in page["data"]:
+                product_id = product.id
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                products.append(product)
+        return products
+
+    def fetch_products(
+        self,
+        pincode: str,
+        categories: Optional[List[str]] = None,
+        profile: Optional[str] = None,
+    ) -> FetchResult:
+        """Fetch products directly from the API using a pooled session.
+
+        Sessions are rotated round-robin across the pincode's pool and are
+        validated from the responses themselves, so no separate validation
+        round-trip is needed. A session is only dropped from the pool once it
+        has been rejected SESSION_MAX_FAILURES times in a row; upstream errors
+        and timeouts do not count against it.
+        Every page of every category is fetched and merged by ``_id``, and
+        only products whose stored fields changed since the last fetch are
+        returned.
+
+        Args:
+            pincode: The pincode to filter products for
+            categories: Categories to fetch (defaults to config.CATEGORIES)
+            profile: Field profile to request (defaults to config.API_FIELD_PROFILE)
+
+        Returns:
+            List of changed Products, UNCHANGED if nothing changed,
+            or None if failed
+        """
+        categories = categories or config.CATEGORIES
+        pool = get_session_pool(pincode)
+        session = pool.acquire()
+        if session is None:
+            logger.warning("No saved session data available for direct API call")
+            return None
+
+        logger.info(f"Making direct API call for pincode: {pincode} (session {session.id})")
+        with stage_seconds.time(stage="fetch_api"):
+            products = self._fetch_categories(pincode, session, categories, profile)
+        if products is None:
+            if not session.is_usable():
+                pool.discard(session)
+            return None
+
+        record_capture(
+            "api", pincode, categories, None if products is UNCHANGED else products
+        )
+        if products is UNCHANGED:
+            fingerprints.record_cycle(skipped=True)
+            logger.info(f"Direct API response unchanged for pincode: {pincode}")
+            return UNCHANGED
+
+        changed = fingerprints.changed_items(pincode, products)
+        if products and not changed:
+            fingerprints.record_cycle(skipped=True)
+            logger.info(f"No product changes in API response for pincode: {pincode}")
+            return UNCHANGED
+
+        fingerprints.record_cycle(skipped=False)
+        logger.info(
+            f"Direct API call successful - retrieved {len(products)} products, "
+            f"{len(changed)} changed"
+        )
+        return changed
 
 
 # Global instance
 api_client = AmulApiClient()
+
+http_requests.set_function(lambda: api_client.stats.snapshot()["requests"])
+http_new_connections.set_function(
+    lambda: api_client.stats.snapshot()["new_connections"]
+)
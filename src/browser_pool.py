@@ -0,0 +1,227 @@
+"""
+Persistent warm Playwright browser pool for the scrape fallback.
+
+Playwright's sync API is bound to the thread that started it, so every pool
+slot is a dedicated worker thread that owns one long-lived Chromium instance
+and a reusable browser context. Scrape jobs from any pincode are queued to
+whichever slot is free, so fallback latency is the page load rather than the
+browser startup.
+"""
+
+import queue
+import random
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Optional
+
+import config
+from logger import default_logger as logger
+from proc_stats import process_tree_rss_mb
+
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+]
+
+_SHUTDOWN = object()
+
+
+class BrowserWorker(threading.Thread):
+    """Pool slot that owns one Playwright instance, browser and context."""
+
+    def __init__(self, pool: "BrowserPool", index: int):
+        super().__init__(name=f"browser-{index}", daemon=True)
+        self.pool = pool
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self.browser_uses = 0
+        self.context_uses = 0
+
+    def _ensure_context(self):
+        """Start the browser and context if they are not already running."""
+        if self._playwright is None:
+            # Imported on first scrape so API-only runs never load Playwright
+            from playwright.sync_api import sync_playwright
+
+            self._playwright = sync_playwright().start()
+        if self._browser is None:
+            self._browser = self._playwright.chromium.launch(
+                headless=True, args=BROWSER_ARGS
+            )
+            self.browser_uses = 0
+            logger.info(f"{self.name}: launched Chromium")
+        if self._context is None:
+            self._context = self._browser.new_context(
+                user_agent=random.choice(USER_AGENTS),
+                locale="en-US",
+                timezone_id="Asia/Kolkata",
+                viewport={"width": 1366, "height": 768},
+                extra_http_headers={"Accept-Language": "en-US,en;q=0.9"},
+            )
+            self.context_uses = 0
+        return self._context
+
+    def _close_context(self) -> None:
+        """Close the current context, keeping the browser running."""
+        if self._context is not None:
+            try:
+                self._context.close()
+            except Exception as e:
+                logger.warning(f"{self.name}: failed to close context: {e}")
+            self._context = None
+
+    def _close_browser(self) -> None:
+        """Close the browser and its context."""
+        self._close_context()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                logger.warning(f"{self.name}: failed to close browser: {e}")
+            self._browser = None
+
+    def _close_all(self) -> None:
+        """Close the browser and stop this thread's Playwright instance."""
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                logger.warning(f"{self.name}: failed to stop Playwright: {e}")
+            self._playwright = None
+
+    def _recycle_if_needed(self, failed: bool) -> None:
+        """Recycle the context or browser after failures, heavy use or memory growth."""
+        if failed or self.browser_uses >= self.pool.max_uses:
+            logger.info(f"{self.name}: recycling browser after {self.browser_uses} uses")
+            self._close_browser()
+            return
+
+        if self.pool.max_memory_mb:
+            rss = process_tree_rss_mb(include_root=False)
+            if rss is not None and rss > self.pool.max_memory_mb:
+                logger.info(
+                    f"{self.name}: recycling browser, pool RSS {rss:.0f}MB "
+                    f"over {self.pool.max_memory_mb}MB cap"
+                )
+                self._close_browser()
+                return
+
+        if self.context_uses >= self.pool.context_max_uses:
+            self._close_context()
+        elif self._context is not None:
+            # Start the next job without the previous pincode's session
+            self._context.clear_cookies()
+
+    def run(self) -> None:
+        """Serve scrape jobs from the pool queue until shutdown."""
+        while True:
+            job = self.pool._jobs.get()
+            if job is _SHUTDOWN:
+                self._close_all()
+                return
+
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            failed = False
+            try:
+                context = self._ensure_context()
+                self.browser_uses += 1
+                self.context_uses += 1
+                future.set_result(fn(context, *args))
+            except Exception as e:
+                failed = True
+                future.set_exception(e)
+
+            try:
+                self._recycle_if_needed(failed)
+            except Exception as e:
+                logger.error(f"{self.name}: failed to recycle browser: {e}")
+                self._browser = None
+                self._context = None
+
+
+class BrowserPool:
+    """Bounded pool of warm browsers shared by every pincode.
+
+    Args:
+        size: Number of browsers kept running
+        max_uses: Scrapes served by a browser before it is relaunched
+        context_max_uses: Scrapes served by a context before it is recreated
+        max_memory_mb: Combined browser RSS above which browsers are relaunched
+    """
+
+    def __init__(
+        self,
+        size: int = config.BROWSER_POOL_SIZE,
+        max_uses: int = config.BROWSER_MAX_USES,
+        context_max_uses: int = config.BROWSER_CONTEXT_MAX_USES,
+        max_memory_mb: int = config.BROWSER_POOL_MAX_MEMORY_MB,
+    ):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self.context_max_uses = max(1, context_max_uses)
+        self.max_memory_mb = max_memory_mb
+        self._jobs: "queue.Queue[Any]" = queue.Queue()
+        self._workers: List[BrowserWorker] = []
+        self._lock = threading.Lock()
+
+    def _start_workers(self) -> None:
+        """Start the worker threads on first use."""
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.size):
+                worker = BrowserWorker(self, index)
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"Started browser pool with {self.size} slots")
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue ``fn(context, *args)`` to run on the next free browser.
+
+        Returns:
+            Future resolving to the function's return value
+        """
+        self._start_workers()
+        future: Future = Future()
+        self._jobs.put((future, fn, args))
+        return future
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run ``fn(context, *args)`` on a pooled browser and wait for the result.
+
+        If the wait times out before a worker has picked the job up, the job
+        is dropped instead of running later for nobody.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        """Close every browser in the pool."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(_SHUTDOWN)
+        for worker in workers:
+            worker.join(timeout=30)
+
+
+# Global instance
+browser_pool = BrowserPool()
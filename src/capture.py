@@ -0,0 +1,131 @@
+"""
+Record upstream product responses to an append-only capture file.
+
+Set CAPTURE_FILE to record every API fetch and scrape. The file is gzip
+compressed JSON Lines, one record per fetch:
+
+    {"ts": 1718000000.5, "source": "api", "pincode": "110001",
+     "categories": ["protein"], "items": [...]}
+
+``items`` holds the tracked fields of each product and is null when the API
+response was byte-for-byte unchanged. Each
+record is flushed as it is written, so a crash loses at most the record in
+progress. Use replay.py to feed a capture back through the database and
+notification path.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+import config
+from logger import default_logger as logger
+from product import Product
+
+
+class CaptureWriter:
+    """Appends capture records to a gzip JSON Lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: Optional[gzip.GzipFile] = None
+        self.records = 0
+
+    def write(
+        self,
+        source: str,
+        pincode: str,
+        categories: List[str],
+        items: Optional[List[Product]],
+    ) -> None:
+        """Append one record and flush it to disk."""
+        record = {
+            "ts": round(time.time(), 3),
+            "source": source,
+            "pincode": pincode,
+            "categories": list(categories),
+            "items": None if items is None else [item.to_dict() for item in items],
+        }
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # Appending starts a new gzip member; readers see one stream
+                self._file = gzip.open(self.path, "ab")
+            self._file.write(line.encode("utf-8"))
+            self._file.flush(zlib.Z_SYNC_FLUSH)
+            self.records += 1
+
+    def close(self) -> None:
+        """Finish the current gzip member."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_captures(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield capture records in order, stopping quietly at a truncated tail.
+
+    Args:
+        path: Capture file written by CaptureWriter
+
+    Yields:
+        Capture record dictionaries
+    """
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Record cut off mid-write
+                yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            logger.warning(f"Capture file {path} ends with an incomplete record")
+
+
+_writer: Optional[CaptureWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_capture_writer() -> Optional[CaptureWriter]:
+    """Return the shared writer for config.CAPTURE_FILE, or None if recording is off."""
+    global _writer
+    if not config.CAPTURE_FILE:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = CaptureWriter(config.CAPTURE_FILE)
+            logger.info(f"Recording upstream responses to {config.CAPTURE_FILE}")
+        return _writer
+
+
+def record_capture(
+    source: str,
+    pincode: str,
+    categories: List[str],
+    items: Optional[List[Product]],
+) -> None:
+    """Record one upstream response if capturing is enabled; never raises."""
+    writer = get_capture_writer()
+    if writer is None:
+        return
+    try:
+        writer.write(source, pincode, categories, items)
+    except Exception as e:
+        logger.error(f"Failed to record capture: {e}")
+
+
+def close_capture() -> None:
+    """Close the shared writer, if one was opened."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -8,16 +8,178 @@ PINCODE = "248001"
 DB_PATH = "/app/data/data.db"  # Update this to ./data/data.db when working on local
 CHECK_INTERVAL_SECONDS = 600  # Check every 10 minutes
 
+# Multi-pincode monitoring
+PINCODES = (
+    [p.strip() for p in os.getenv("PINCODES", "").split(",") if p.strip()]
+    if os.getenv("PINCODES")
+    else [PINCODE]
+)  # Comma-separated pincodes, defaults to PINCODE
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))  # Pincodes checked concurrently
+MAX_CONCURRENT_SCRAPES = int(os.getenv("MAX_CONCURRENT_SCRAPES", "2"))
+SESSION_DIR = "data/sessions"  # Per-pincode cookies and headers
+SESSION_EXPIRY_MARGIN_SECONDS = 60  # Treat cookies as expired this early
+
+# Adaptive polling
+POLL_MIN_INTERVAL_SECONDS = int(
+    os.getenv("POLL_MIN_INTERVAL_SECONDS", "60")
+)  # Fastest a volatile (pincode, category) is polled
+POLL_MAX_INTERVAL_SECONDS = int(
+    os.getenv("POLL_MAX_INTERVAL_SECONDS", "1800")
+)  # Slowest a quiet or failing (pincode, category) is polled
+POLL_HOT_MAX_INTERVAL_SECONDS = 180  # Cap while a target keeps restocking
+POLL_HOT_THRESHOLD = 0.2  # Restock rate above which a target counts as hot
+POLL_SPEEDUP_FACTOR = 0.5  # Interval multiplier after a poll that saw changes
+POLL_SLOWDOWN_FACTOR = 1.25  # Interval multiplier after a quiet poll
+POLL_RATE_SMOOTHING = 0.3  # Weight of the latest poll in the change/restock rates
+POLL_JITTER_FRACTION = 0.1  # Randomise every delay by +/- this fraction
+POLL_STARTUP_SPREAD_SECONDS = 30  # Stagger first polls across this window
+
+# Monitor pipeline
+PIPELINE_QUEUE_SIZE = int(
+    os.getenv("PIPELINE_QUEUE_SIZE", "32")
+)  # Batches buffered between fetch, diff, persist and notify stages
+
+# Sharing targets between monitor instances
+WORK_QUEUE_BACKEND = os.getenv(
+    "WORK_QUEUE_BACKEND", ""
+)  # "sqlite" to share targets between instances, "memory" for a local stand-in, empty for off
+WORK_QUEUE_DB_PATH = os.getenv(
+    "WORK_QUEUE_DB_PATH", DB_PATH
+)  # SQLite file every instance can open
+WORK_QUEUE_NODE_ID = os.getenv("WORK_QUEUE_NODE_ID", "")  # Defaults to hostname-pid
+WORK_LEASE_SECONDS = int(
+    os.getenv("WORK_LEASE_SECONDS", "90")
+)  # A dead instance's targets are reassigned after this long
+WORK_HEARTBEAT_SECONDS = 30  # How often held leases are extended
+
+# Record and replay
+CAPTURE_FILE = os.getenv(
+    "CAPTURE_FILE", ""
+)  # e.g. data/capture.jsonl.gz; records every upstream response when set
+
+# Read API for current stock
+STOCK_API_ENABLED = os.getenv("STOCK_API_ENABLED", "True").lower() == "true"
+STOCK_API_HOST = os.getenv("STOCK_API_HOST", "127.0.0.1")  # Use 0.0.0.0 inside Docker
+STOCK_API_PORT = int(os.getenv("STOCK_API_PORT", "9109"))  # GET /stock is served here
+
+# Metrics endpoint
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Use 0.0.0.0 inside Docker
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # Prometheus scrapes /metrics here
+
+# Session pool and background harvesting
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "2"))  # Sessions kept per pincode
+SESSION_MAX_FAILURES = 3  # Rejected requests in a row before a session is dropped
+SESSION_MAX_AGE_SECONDS = 6 * 3600  # Harvest a replacement after this age
+SESSION_REFRESH_AHEAD_SECONDS = 900  # Harvest a replacement this long before expiry
+SESSION_HARVESTER_ENABLED = os.getenv("SESSION_HARVESTER_ENABLED", "True").lower() == "true"
+SESSION_HARVEST_INTERVAL_SECONDS = 60  # How often the harvester checks the pools
+SESSION_HARVEST_STARTUP_DELAY_SECONDS = 60  # First checks scrape cold pools inline anyway
+SESSION_HARVEST_MAX_IN_FLIGHT = max(
+    1, MAX_CONCURRENT_SCRAPES - 1
+)  # Scrape slots harvests may hold; the rest stay free for inline fallbacks
+
 # API Configuration
-API_URL = "https://shop.amul.com/api/1/entity/ms.products?fields[name]=1&fields[brand]=1&fields[categories]=1&fields[collections]=1&fields[alias]=1&fields[sku]=1&fields[price]=1&fields[compare_price]=1&fields[original_price]=1&fields[images]=1&fields[metafields]=1&fields[discounts]=1&fields[catalog_only]=1&fields[is_catalog]=1&fields[seller]=1&fields[available]=1&fields[inventory_quantity]=1&fields[net_quantity]=1&fields[num_reviews]=1&fields[avg_rating]=1&fields[inventory_low_stock_quantity]=1&fields[inventory_allow_out_of_stock]=1&fields[default_variant]=1&fields[variants]=1&fields[lp_seller_ids]=1&filters[0][field]=categories&filters[0][value][0]=protein&filters[0][operator]=in&filters[0][original]=1&facets=true&facetgroup=default_category_facet&limit=24&total=1&start=0"
+API_BASE_URL = os.getenv(
+    "API_BASE_URL", "https://shop.amul.com/api/1/entity/ms.products"
+)  # Products endpoint; query strings come from products_query.build_products_url
+API_FIELD_PROFILE = os.getenv(
+    "API_FIELD_PROFILE", "stock"
+)  # "stock" for the lean poll payload, "full" for the whole catalog record
+
+# Tiered fetch strategy and circuit breakers
+FETCH_API_ATTEMPTS = int(
+    os.getenv("FETCH_API_ATTEMPTS", "3")
+)  # API calls per check, on rotating sessions, before it may escalate
+FETCH_API_BACKOFF_SECONDS = 0.5  # Wait before the first API retry; doubles per retry
+API_BREAKER_FAILURES = int(
+    os.getenv("API_BREAKER_FAILURES", "5")
+)  # Consecutive API failures that open a pincode's API circuit
+SCRAPE_BREAKER_FAILURES = int(
+    os.getenv("SCRAPE_BREAKER_FAILURES", "2")
+)  # Consecutive failed scrapes that open a pincode's scrape circuit
+BREAKER_FAILURE_RATE = 0.5  # Also open once this share of the recent window failed
+BREAKER_WINDOW = 20  # Recent calls the failure rate is computed over
+BREAKER_COOLDOWN_SECONDS = int(
+    os.getenv("BREAKER_COOLDOWN_SECONDS", "60")
+)  # Time an open circuit waits before a probe; doubles per failed probe
+BREAKER_MAX_COOLDOWN_SECONDS = 1800  # Cap for the doubling cooldown
+
+# Browser pool for the scrape fallback
+BROWSER_POOL_SIZE = MAX_CONCURRENT_SCRAPES  # Warm browsers kept running
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))  # Relaunch after N scrapes
+BROWSER_CONTEXT_MAX_USES = 10  # Recreate the browser context after N scrapes
+BROWSER_POOL_MAX_MEMORY_MB = int(
+    os.getenv("BROWSER_POOL_MAX_MEMORY_MB", "1024")
+)  # Relaunch browsers when their combined RSS exceeds this (0 disables)
+SCRAPE_TIMEOUT_SECONDS = 120  # Hard limit; a worker process still busy is killed
+
+# Supervised scrape worker processes
+SCRAPE_WORKER_PROCESSES = (
+    os.getenv("SCRAPE_WORKER_PROCESSES", "True").lower() == "true"
+)  # Run browsers in child processes instead of the monitor process
+SCRAPE_WORKER_MAX_JOBS = int(
+    os.getenv("SCRAPE_WORKER_MAX_JOBS", "25")
+)  # Replace a worker process after N scrapes
+SCRAPE_WORKER_MAX_RSS_MB = int(
+    os.getenv("SCRAPE_WORKER_MAX_RSS_MB", "1024")
+)  # Replace a worker whose process tree (with Chromium) exceeds this (0 disables)
+SCRAPE_WORKER_STOP_SECONDS = 10  # Grace period for a worker to close its browser
+
+# Scrape behaviour
+SCRAPE_FAST_MODE = (
+    os.getenv("SCRAPE_FAST_MODE", "False").lower() == "true"
+)  # Block non-essential resources and skip fixed waits
+SCRAPE_HUMAN_JITTER = (
+    os.getenv("SCRAPE_HUMAN_JITTER", "True").lower() == "true"
+)  # Random pause before submitting the pincode
+SCRAPE_BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+SCRAPE_BLOCKED_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "connect.facebook.com",
+    "clarity.ms",
+    "hotjar.com",
+]
+
+# HTTP transport
+HTTP_TIMEOUT = 30
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))  # Hosts kept pooled
+HTTP_POOL_MAXSIZE = int(
+    os.getenv("HTTP_POOL_MAXSIZE", str(MAX_WORKERS))
+)  # Keep-alive connections per host
+
+# Catalog coverage
+CATEGORIES = (
+    [c.strip() for c in os.getenv("CATEGORIES", "").split(",") if c.strip()]
+    if os.getenv("CATEGORIES")
+    else ["protein"]
+)  # Comma-separated categories fetched for every pincode
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "24"))  # Products per API page
+PAGE_FETCH_WORKERS = int(os.getenv("PAGE_FETCH_WORKERS", "8"))  # Pages fetched at once
 
 # Email Configuration
 EMAIL_ENABLED = os.getenv("EMAIL_ENABLED", "True").lower() == "true"
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = (
+    os.getenv("SMTP_STARTTLS", "True").lower() == "true"
+)  # Disable only for a local relay or test sink
 EMAIL_FROM = os.getenv("EMAIL_FROM", "")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 EMAIL_TO = (
     os.getenv("EMAIL_TO", "").split(",") if os.getenv("EMAIL_TO") else []
-)  # Comma-separated emails
+)  # Comma-separated emails, notified of every restock
 EMAIL_SUBJECT = os.getenv("EMAIL_SUBJECT", "Back in Stock")
+
+SUBSCRIPTIONS_FILE = os.getenv(
+    "SUBSCRIPTIONS_FILE", ""
+)  # Optional JSON list of {email, pincode, product_id} imported at startup
+
+# Notification delivery
+OUTBOX_DIR = "data/outbox"  # Queued email survives restarts here
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+NOTIFICATION_RETRY_BASE_SECONDS = 30  # Doubles after every failed attempt
+SMTP_IDLE_CHECK_SECONDS = 60  # NOOP-check the SMTP connection after this idle time
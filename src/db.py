@@ -1,23 +1,108 @@
 import sqlite3
+import threading
+import time
 import config
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+from fingerprint import fingerprints
 from notification import send_consolidated_notification
 from logger import default_logger as logger
+from metrics import items_changed, restocks, stage_seconds
+from product import Product
+from stock_api import stock_snapshot
+
+# Long-lived connection shared by every caller; guarded by _db_lock
+_connection: Optional[sqlite3.Connection] = None
+_db_lock = threading.RLock()
+
+# In-memory mirror of current stock: {(pincode, item_id): (name, quantity, available)}
+# Guarded by _mirror_lock, which is always taken before _db_lock when both are held
+_stock_cache: Optional[Dict[Tuple[str, str], Tuple[str, int, int]]] = None
+_mirror_lock = threading.RLock()
+
+# Interned integer IDs, filled lazily from the pincodes/products tables
+_pincode_ids: Dict[str, int] = {}
+_product_ids: Dict[str, int] = {}
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # Safe with WAL; skips an fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",  # 8 MB page cache
+    "PRAGMA busy_timeout=5000",
+]
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns the shared database connection, opening and tuning it on first use."""
+    global _connection
+    with _db_lock:
+        if _connection is None:
+            conn = sqlite3.connect(config.DB_PATH, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            _connection = conn
+        return _connection
+
+
+def close_db() -> None:
+    """Closes the shared connection and drops the in-memory mirror."""
+    global _connection, _stock_cache
+    with _mirror_lock, _db_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        _stock_cache = None
+        _pincode_ids.clear()
+        _product_ids.clear()
 
 
 def init_db() -> None:
-    """Initializes the database and creates the items table if it doesn't exist."""
+    """
+    Initializes the database schema if it doesn't exist.
+
+    Current stock is keyed by (pincode, product) and every availability
+    transition is appended to stock_events. Pincodes and product IDs are
+    interned to small integers so the history rows and indexes stay compact.
+    """
     try:
-        with sqlite3.connect(config.DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS items (
-                    id TEXT PRIMARY KEY,
-                    name TEXT,
+        with _db_lock:
+            conn = get_connection()
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pincodes (
+                    id INTEGER PRIMARY KEY,
+                    code TEXT NOT NULL UNIQUE
+                );
+
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    external_id TEXT NOT NULL UNIQUE, -- Amul _id
+                    name TEXT
+                );
+
+                CREATE TABLE IF NOT EXISTS stock_current (
+                    pincode_id INTEGER NOT NULL REFERENCES pincodes(id),
+                    product_id INTEGER NOT NULL REFERENCES products(id),
                     quantity INTEGER,
-                    available INTEGER -- 0 for false, 1 for true
-                )
+                    available INTEGER, -- 0 for false, 1 for true
+                    updated_at INTEGER NOT NULL, -- unix seconds
+                    PRIMARY KEY (pincode_id, product_id)
+                ) WITHOUT ROWID;
+
+                -- Append-only: one row per availability transition
+                CREATE TABLE IF NOT EXISTS stock_events (
+                    id INTEGER PRIMARY KEY,
+                    pincode_id INTEGER NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    ts INTEGER NOT NULL, -- unix seconds
+                    available INTEGER NOT NULL,
+                    quantity INTEGER
+                );
+
+                -- Covers "when was product X last (un)available at pincode Y"
+                CREATE INDEX IF NOT EXISTS idx_stock_events_lookup
+                    ON stock_events (pincode_id, product_id, available, ts);
             """)
+            _migrate_legacy_items(conn)
             conn.commit()
             logger.info("Database initialized successfully.")
     except sqlite3.Error as e:
@@ -25,69 +110,370 @@ def init_db() -> None:
         raise
 
 
-def get_current_stock_status() -> Dict[str, int]:
+def _migrate_legacy_items(conn: sqlite3.Connection) -> None:
+    """Copies rows from the old single-pincode items table, once.
+
+    The legacy table tracked config.PINCODE only. It is left in place and no
+    longer written to.
+    """
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='items'"
+    ).fetchone()
+    has_current = conn.execute("SELECT 1 FROM stock_current LIMIT 1").fetchone()
+    if not legacy or has_current:
+        return
+
+    rows = conn.execute("SELECT id, name, quantity, available FROM items").fetchall()
+    if not rows:
+        return
+    now = int(time.time())
+    # Left unpublished; the caches fill from the committed tables on first use
+    new_pincodes: Dict[str, int] = {}
+    new_products: Dict[str, int] = {}
+    pincode_id = _intern_pincode(conn, config.PINCODE, new_pincodes)
+    for item_id, name, quantity, available in rows:
+        product_id = _intern_product(conn, item_id, name, new_products)
+        conn.execute(
+            "INSERT INTO stock_current VALUES (?, ?, ?, ?, ?)",
+            (pincode_id, product_id, quantity, available, now),
+        )
+        conn.execute(
+            "INSERT INTO stock_events (pincode_id, product_id, ts, available, quantity) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (pincode_id, product_id, now, available, quantity),
+        )
+    logger.info(f"Migrated {len(rows)} legacy items for pincode {config.PINCODE}.")
+
+
+def _intern_pincode(conn: sqlite3.Connection, code: str, created: Dict[str, int]) -> int:
+    """Returns the integer ID for a pincode, creating it if needed.
+
+    IDs that are not cached yet go into ``created`` instead of the shared
+    cache. The caller publishes them once its transaction has committed, so
+    a rollback cannot leave cached IDs behind for rows that no longer exist.
+    """
+    pincode_id = _pincode_ids.get(code)
+    if pincode_id is None:
+        pincode_id = created.get(code)
+    if pincode_id is None:
+        conn.execute("INSERT OR IGNORE INTO pincodes (code) VALUES (?)", (code,))
+        pincode_id = conn.execute(
+            "SELECT id FROM pincodes WHERE code = ?", (code,)
+        ).fetchone()[0]
+        created[code] = pincode_id
+    return pincode_id
+
+
+def _intern_product(
+    conn: sqlite3.Connection, external_id: str, name: str, created: Dict[str, int]
+) -> int:
+    """Returns the integer ID for an Amul product ID, creating it if needed.
+
+    New IDs go into ``created`` until the transaction commits, as for
+    _intern_pincode.
     """
-    Retrieves the current availability status of all items from the database.
+    product_id = _product_ids.get(external_id)
+    if product_id is None:
+        product_id = created.get(external_id)
+    if product_id is None:
+        conn.execute(
+            "INSERT OR IGNORE INTO products (external_id, name) VALUES (?, ?)",
+            (external_id, name),
+        )
+        product_id = conn.execute(
+            "SELECT id FROM products WHERE external_id = ?", (external_id,)
+        ).fetchone()[0]
+        created[external_id] = product_id
+    return product_id
+
+
+def read_current_stock() -> List[Tuple[str, str, str, int, int]]:
+    """Returns every (pincode, product ID, name, quantity, available) row on disk."""
+    with _db_lock:
+        return get_connection().execute("""
+            SELECT pc.code, p.external_id, p.name, s.quantity, s.available
+            FROM stock_current s
+            JOIN pincodes pc ON pc.id = s.pincode_id
+            JOIN products p ON p.id = s.product_id
+        """).fetchall()
+
+
+def _load_stock_cache() -> Dict[Tuple[str, str], Tuple[str, int, int]]:
+    """Returns the in-memory mirror of current stock, reading it once."""
+    global _stock_cache
+    if _stock_cache is None:
+        rows = read_current_stock()
+        _stock_cache = {(row[0], row[1]): (row[2], row[3], row[4]) for row in rows}
+        logger.info(f"Loaded {len(_stock_cache)} items into the stock mirror.")
+    return _stock_cache
+
+
+def invalidate_stock_cache() -> None:
+    """Drops the in-memory mirror so the next diff reloads it from the tables.
+
+    Used after a failed write, so changes that never reached disk are
+    detected again. The interned ID caches are dropped too and refill from
+    the tables.
+    """
+    global _stock_cache
+    with _mirror_lock, _db_lock:
+        _stock_cache = None
+        _pincode_ids.clear()
+        _product_ids.clear()
+
+
+def refresh_stock_cache(pincode: str) -> None:
+    """Re-reads one pincode's rows into the mirror and the stock snapshot.
+
+    Used when another monitor instance has been writing this pincode, so the
+    mirror matches what is on disk before the next diff, and the stock API
+    serves what the other instance wrote.
+    """
+    with _mirror_lock:
+        with _db_lock:
+            rows = get_connection().execute("""
+                SELECT p.external_id, p.name, s.quantity, s.available
+                FROM stock_current s
+                JOIN pincodes pc ON pc.id = s.pincode_id
+                JOIN products p ON p.id = s.product_id
+                WHERE pc.code = ?
+            """, (pincode,)).fetchall()
+        # An unloaded mirror reads everything fresh on the next diff anyway
+        if _stock_cache is not None:
+            for key in [key for key in _stock_cache if key[0] == pincode]:
+                del _stock_cache[key]
+            for item_id, name, quantity, available in rows:
+                _stock_cache[(pincode, item_id)] = (name, quantity, available)
+        stock_snapshot.replace_pincode(pincode, rows)
+
+
+def get_current_stock_status(pincode: Optional[str] = None) -> Dict[str, int]:
+    """
+    Retrieves the current availability status of all items at a pincode.
+
+    Served from the in-memory mirror; the tables are only read on first use.
+
+    Args:
+        pincode: Pincode to report (defaults to config.PINCODE)
 
     Returns:
         A dictionary mapping item ID to its availability status (1 for available, 0 for not).
     """
+    pincode = pincode or config.PINCODE
     try:
-        with sqlite3.connect(config.DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT id, available FROM items")
-            # Create a dictionary of {id: available_status}
-            return {row[0]: row[1] for row in cur.fetchall()}
+        with _mirror_lock:
+            return {
+                item_id: state[2]
+                for (code, item_id), state in _load_stock_cache().items()
+                if code == pincode
+            }
     except sqlite3.Error as e:
         logger.error(f"Failed to get current stock status from DB: {e}")
         return {}
 
 
-def update_db_and_notify(new_items: List[Dict[str, Any]]) -> None:
+def last_in_stock(pincode: str, item_id: str) -> Optional[int]:
     """
-    Updates the database with new item data and sends notifications for state changes.
-    Only notifies if an item changes from unavailable to available.
+    Returns when an item was last seen becoming available at a pincode.
+
+    Answered from the covering index on stock_events, so it stays fast as
+    history grows.
+
+    Returns:
+        Unix timestamp of the latest transition to available, or None if never
     """
-    old_stock_status = get_current_stock_status()
+    with _db_lock:
+        row = get_connection().execute(
+            """
+            SELECT MAX(e.ts)
+            FROM stock_events e
+            WHERE e.pincode_id = (SELECT id FROM pincodes WHERE code = ?)
+              AND e.product_id = (SELECT id FROM products WHERE external_id = ?)
+              AND e.available = 1
+        """,
+            (pincode, item_id),
+        ).fetchone()
+    return row[0] if row else None
+
 
-    items_to_update: List[Tuple] = []
+def diff_items(
+    pincode: str,
+    new_items: List[Product],
+) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+    """
+    Compares fetched items for a pincode against the stock mirror.
+
+    Returns:
+        Tuple of (changes as (pincode, item_id, name, quantity, available,
+        availability_changed, name_changed) tuples, items that went from
+        unavailable to available)
+    """
+    stock = _load_stock_cache()
+    changes: List[Tuple] = []
     newly_available_items: List[Dict[str, Any]] = []
 
     for item in new_items:
-        item_id = item["_id"]
-        name = item["name"]
-        quantity = item.get("inventory_quantity", 0)
-        is_available = 1 if item.get("available", False) else 0
+        item_id = item.id
+        name = item.name
+        quantity = item.inventory_quantity
+        is_available = 1 if item.available else 0
 
-        items_to_update.append((item_id, name, quantity, is_available))
+        old_state = stock.get((pincode, item_id))
+        if old_state == (name, quantity, is_available):
+            continue
+
+        # First sightings and availability flips are recorded in the history
+        availability_changed = old_state is None or old_state[2] != is_available
+        name_changed = old_state is not None and old_state[0] != name
+        changes.append(
+            (
+                pincode,
+                item_id,
+                name,
+                quantity,
+                is_available,
+                availability_changed,
+                name_changed,
+            )
+        )
 
-        # Check for notification condition
         # Item is newly available if its new status is 1 and old status was 0 or not present
-        # Default to 0 (unavailable) if not in DB
-        old_status = old_stock_status.get(item_id, 0)
+        old_status = old_state[2] if old_state else 0
         if is_available and not old_status:
-            newly_available_items.append({"name": name, "quantity": quantity})
+            newly_available_items.append(
+                {
+                    "pincode": pincode,
+                    "product_id": item_id,
+                    "name": name,
+                    "quantity": quantity,
+                }
+            )
 
-    # Batch update the database
-    try:
-        with sqlite3.connect(config.DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.executemany(
+    return changes, newly_available_items
+
+
+def apply_to_mirror(changes: List[Tuple]) -> None:
+    """Applies diffed changes to the in-memory mirror."""
+    with _mirror_lock:
+        stock = _load_stock_cache()
+        for pincode, item_id, name, quantity, available, *_ in changes:
+            stock[(pincode, item_id)] = (name, quantity, available)
+
+
+def stage_changes(
+    pincode: str, new_items: List[Product]
+) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+    """
+    Diffs fetched items and applies the result to the mirror straight away.
+
+    The caller writes the returned changes with write_changes afterwards, so
+    the next fetch for the pincode can be diffed while the write is pending.
+
+    Returns:
+        Same as diff_items
+    """
+    with stage_seconds.time(stage="diff"), _mirror_lock:
+        changes, newly_available_items = diff_items(pincode, new_items)
+        apply_to_mirror(changes)
+    items_changed.inc(len(changes))
+    restocks.inc(len(newly_available_items))
+    return changes, newly_available_items
+
+
+def write_changes(changes: List[Tuple]) -> None:
+    """Writes changed current state plus history events in one transaction."""
+    if not changes:
+        return
+    now = int(time.time())
+    current_rows = []
+    event_rows = []
+    renamed = []
+    new_pincodes: Dict[str, int] = {}
+    new_products: Dict[str, int] = {}
+
+    with stage_seconds.time(stage="persist"), _db_lock:
+        conn = get_connection()
+        with conn:
+            for (
+                pincode,
+                item_id,
+                name,
+                quantity,
+                available,
+                availability_changed,
+                name_changed,
+            ) in changes:
+                pincode_id = _intern_pincode(conn, pincode, new_pincodes)
+                product_id = _intern_product(conn, item_id, name, new_products)
+                if name_changed:
+                    renamed.append((name, product_id))
+                current_rows.append((pincode_id, product_id, quantity, available, now))
+                if availability_changed:
+                    event_rows.append((pincode_id, product_id, now, available, quantity))
+
+            conn.executemany(
                 """
-                INSERT INTO items (id, name, quantity, available)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    name=excluded.name,
+                INSERT INTO stock_current (pincode_id, product_id, quantity, available, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(pincode_id, product_id) DO UPDATE SET
                     quantity=excluded.quantity,
-                    available=excluded.available
+                    available=excluded.available,
+                    updated_at=excluded.updated_at
             """,
-                items_to_update,
+                current_rows,
             )
-            conn.commit()
-            logger.info(f"Database updated with {len(items_to_update)} items.")
+            if event_rows:
+                conn.executemany(
+                    "INSERT INTO stock_events (pincode_id, product_id, ts, available, quantity) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    event_rows,
+                )
+            if renamed:
+                conn.executemany("UPDATE products SET name = ? WHERE id = ?", renamed)
+        # Only IDs whose rows were committed are cached
+        _pincode_ids.update(new_pincodes)
+        _product_ids.update(new_products)
+        # Readers only ever see committed state
+        stock_snapshot.apply(changes)
+
+
+def persist_changes(changes: List[Tuple]) -> None:
+    """Writes changed current state plus history events, then updates the mirror."""
+    write_changes(changes)
+    apply_to_mirror(changes)
+
+
+def update_db_and_notify(
+    new_items: List[Product], pincode: str
+) -> Tuple[int, int]:
+    """
+    Updates the database with new item data for a pincode and sends notifications for state changes.
+    Only rows whose name, quantity or availability changed are written.
+    Only notifies if an item changes from unavailable to available.
+
+    Returns:
+        Tuple of (items changed, items restocked), used by the poll scheduler
+    """
+    changes: List[Tuple] = []
+    newly_available_items: List[Dict[str, Any]] = []
+    try:
+        with _mirror_lock:
+            changes, newly_available_items = diff_items(pincode, new_items)
+            persist_changes(changes)
+        items_changed.inc(len(changes))
+        restocks.inc(len(newly_available_items))
+        logger.info(
+            f"Database updated with {len(changes)} changed of {len(new_items)} items "
+            f"for pincode {pincode}."
+        )
     except sqlite3.Error as e:
         logger.error(f"Database update failed: {e}")
+        # Make the next fetch resend every item instead of only the changed ones
+        fingerprints.forget(pincode)
+        changes, newly_available_items = [], []
 
     # Send consolidated notification for all newly available items
     if newly_available_items:
         send_consolidated_notification(newly_available_items)
+
+    return len(changes), len(newly_available_items)
@@ -0,0 +1,401 @@
+"""
+Tiered fetch strategy with a circuit breaker per tier and pincode.
+
+A check is served by the cheapest tier that can serve it:
+
+1. ``api``: a direct API call on a pooled session (well under a second)
+2. ``scrape``: a full Playwright scrape (many seconds and a browser slot)
+
+A failed API call is retried on the next pooled session after a short,
+jittered backoff. Only when the API tier has nothing left to offer (no usable
+session, or its breaker is open) does the check escalate to a scrape, and
+only if the scrape breaker is closed and a scrape slot is free. Otherwise the
+check fails fast and the scheduler backs the target off.
+
+Each (tier, pincode) pair has a breaker that opens after consecutive failures
+or a high failure rate over its recent calls. An open breaker lets one probe
+through per cooldown, and the cooldown doubles each time the probe fails, so
+an upstream outage costs a probe now and then instead of a browser launch on
+every check. Breakers also track the latency of their tier, which is used to
+skip a scrape when the API tier will be probed again sooner than the scrape
+would take.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import config
+from api_client import api_client
+from fingerprint import UNCHANGED, FetchResult
+from logger import default_logger as logger
+from metrics import (
+    circuit_breakers_open,
+    fetch_tier_attempts,
+    fetch_tier_cost,
+    scrape_fallbacks,
+    session_lookups,
+)
+from product import Product
+from session_pool import get_session_pool
+
+API = "api"
+SCRAPE = "scrape"
+TIERS = (API, SCRAPE)
+
+# Assumed cost of a tier, in seconds, before any call has been timed
+DEFAULT_TIER_COST = {API: 1.0, SCRAPE: 30.0}
+
+# Weight of the newest call in a breaker's latency average
+LATENCY_SMOOTHING = 0.2
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker guarding one tier for one pincode.
+
+    Args:
+        name: Label for log messages, e.g. "api:110001"
+        failure_threshold: Consecutive failures that open the breaker
+        failure_rate: Failure share of the recent window that opens it
+        window: Number of recent calls the failure rate is computed over
+        cooldown: Seconds the breaker stays open the first time
+        max_cooldown: Upper bound for the cooldown, which doubles per failed probe
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        failure_rate: float = config.BREAKER_FAILURE_RATE,
+        window: int = config.BREAKER_WINDOW,
+        cooldown: float = config.BREAKER_COOLDOWN_SECONDS,
+        max_cooldown: float = config.BREAKER_MAX_COOLDOWN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.failure_rate_limit = failure_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.latency: Optional[float] = None  # Smoothed seconds per call
+        self._cooldown = cooldown
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def failure_rate(self) -> float:
+        """Share of failed calls in the recent window."""
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Return True if a call may go through now.
+
+        Once the cooldown has passed, one caller gets a probe call; others are
+        turned away until it reports back (or until another cooldown passes, in
+        case the probe was never reported).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if now < self.opened_until:
+                return False
+            if self.state == self.OPEN:
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit {self.name} half-open, probing")
+            elif (
+                self._probe_started is not None
+                and now - self._probe_started < self._cooldown
+            ):
+                return False
+            self._probe_started = now
+            return True
+
+    def retry_in(self, now: Optional[float] = None) -> float:
+        """Return seconds until the breaker lets a call through again."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            return max(0.0, self.opened_until - now)
+
+    def _observe(self, ok: bool, latency: Optional[float]) -> None:
+        """Add a call to the window and latency average; caller holds the lock."""
+        self._outcomes.append(ok)
+        if latency is not None:
+            self.latency = (
+                latency
+                if self.latency is None
+                else LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+            )
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """Record a successful call and close the breaker if it was probing."""
+        with self._lock:
+            self._observe(True, latency)
+            self.consecutive_failures = 0
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed after a successful probe")
+                self.state = self.CLOSED
+                self._cooldown = self.base_cooldown
+                self._probe_started = None
+                # Start the rate over so old failures do not reopen it at once
+                self._outcomes.clear()
+
+    def record_failure(self, latency: Optional[float] = None) -> None:
+        """Record a failed call, opening the breaker if it trips a limit."""
+        now = time.time()
+        with self._lock:
+            self._observe(False, latency)
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN:
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open(now, "probe failed")
+                return
+            if self.state == self.OPEN:
+                return
+
+            failures = self._outcomes.count(False)
+            if self.consecutive_failures >= self.failure_threshold:
+                self._open(now, f"{self.consecutive_failures} consecutive failures")
+            elif (
+                len(self._outcomes) == self._outcomes.maxlen
+                and failures / len(self._outcomes) >= self.failure_rate_limit
+            ):
+                self._open(now, f"{failures}/{len(self._outcomes)} recent calls failed")
+
+    def _open(self, now: float, reason: str) -> None:
+        """Open the breaker for the current cooldown; caller holds the lock."""
+        self.state = self.OPEN
+        self.opened_until = now + self._cooldown
+        self._probe_started = None
+        logger.warning(f"Circuit {self.name} open for {self._cooldown:.0f}s: {reason}")
+
+
+class FetchStrategy:
+    """Chooses the fetch tier for each check and keeps the tier breakers.
+
+    Args:
+        api_attempts: API calls made for one check before it may escalate
+        api_backoff: Seconds before the first API retry; doubles per retry
+        max_scrapes: Scrapes, inline and background, queued or running at once
+        max_background: Slots that background scrapes (session harvests) may hold
+    """
+
+    def __init__(
+        self,
+        api_attempts: int = config.FETCH_API_ATTEMPTS,
+        api_backoff: float = config.FETCH_API_BACKOFF_SECONDS,
+        max_scrapes: int = config.MAX_CONCURRENT_SCRAPES,
+        max_background: int = config.SESSION_HARVEST_MAX_IN_FLIGHT,
+    ):
+        self.api_attempts = max(1, api_attempts)
+        self.api_backoff = api_backoff
+        self.max_background = max(1, max_background)
+        self._scrape_slots = threading.BoundedSemaphore(max(1, max_scrapes))
+        self._background_scrapes = 0
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def acquire_scrape_slot(self, background: bool = False) -> bool:
+        """Reserve a scrape slot without waiting; returns False if none is free.
+
+        Every scrape sent to the browser pool holds a slot, so jobs never
+        queue there behind each other. Background scrapes are also limited
+        to ``max_background`` slots, leaving the rest for inline fallbacks.
+        """
+        with self._lock:
+            if background and self._background_scrapes >= self.max_background:
+                return False
+            if not self._scrape_slots.acquire(blocking=False):
+                return False
+            if background:
+                self._background_scrapes += 1
+            return True
+
+    def release_scrape_slot(self, background: bool = False) -> None:
+        """Give back a slot taken with acquire_scrape_slot."""
+        with self._lock:
+            if background:
+                self._background_scrapes -= 1
+            self._scrape_slots.release()
+
+    def breaker(self, tier: str, pincode: str) -> CircuitBreaker:
+        """Return the breaker for a tier and pincode, creating it on first use."""
+        key = (tier, pincode)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                threshold = (
+                    config.API_BREAKER_FAILURES
+                    if tier == API
+                    else config.SCRAPE_BREAKER_FAILURES
+                )
+                breaker = CircuitBreaker(f"{tier}:{pincode}", threshold)
+                self._breakers[key] = breaker
+            return breaker
+
+    def _tier_breakers(self, tier: str) -> List[CircuitBreaker]:
+        with self._lock:
+            return [b for (t, _), b in self._breakers.items() if t == tier]
+
+    def open_count(self, tier: str) -> int:
+        """Return how many pincodes currently have the tier's breaker open."""
+        return sum(
+            1 for b in self._tier_breakers(tier) if b.state != CircuitBreaker.CLOSED
+        )
+
+    def tier_cost(self, tier: str, pincode: Optional[str] = None) -> float:
+        """Return the expected seconds per call of a tier.
+
+        Uses the pincode's own latency when known, then the average over all
+        pincodes, then DEFAULT_TIER_COST.
+        """
+        if pincode is not None:
+            latency = self.breaker(tier, pincode).latency
+            if latency is not None:
+                return latency
+        latencies = [b.latency for b in self._tier_breakers(tier) if b.latency is not None]
+        if latencies:
+            return sum(latencies) / len(latencies)
+        return DEFAULT_TIER_COST[tier]
+
+    def _backoff(self, attempt: int) -> None:
+        """Sleep before API retry number ``attempt`` (1-based), with jitter."""
+        delay = self.api_backoff * (2 ** (attempt - 1))
+        if delay > 0:
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _fetch_api(self, pincode: str, categories: List[str]) -> FetchResult:
+        """Try the API tier, retrying with backoff while sessions and the breaker allow.
+
+        Returns:
+            The API result, or None if every attempt failed
+        """
+        breaker = self.breaker(API, pincode)
+        pool = get_session_pool(pincode)
+        for attempt in range(self.api_attempts):
+            # Give up before backing off when no further attempt could be made
+            if not pool.usable_count() or not breaker.allow():
+                return None
+            if attempt:
+                self._backoff(attempt)
+
+            logger.info("Attempting direct API call with pooled session data")
+            started = time.monotonic()
+            result = api_client.fetch_products(pincode, categories)
+            elapsed = time.monotonic() - started
+            if result is None:
+                breaker.record_failure(elapsed)
+                fetch_tier_attempts.inc(tier=API, result="failed")
+                continue
+            breaker.record_success(elapsed)
+            fetch_tier_attempts.inc(tier=API, result="ok")
+            return result
+        return None
+
+    def _should_scrape(self, pincode: str, api_result: FetchResult) -> Optional[str]:
+        """Return why the check should escalate to a scrape, or None to fail fast."""
+        if api_result is not None:
+            return "API response was empty"
+        if not get_session_pool(pincode).usable_count():
+            return "no usable session"
+        api_breaker = self.breaker(API, pincode)
+        if api_breaker.state == CircuitBreaker.CLOSED:
+            # The sessions still look good; retrying the cheap tier later wins
+            return None
+        if api_breaker.retry_in() < self.tier_cost(SCRAPE, pincode):
+            # The API will be probed again before a scrape would finish
+            return None
+        return "API circuit open"
+
+    def fetch(
+        self,
+        pincode: str,
+        categories: List[str],
+        scrape: Callable[[str, Optional[str]], List[Product]],
+    ) -> FetchResult:
+        """Serve one check from the cheapest tier that can serve it.
+
+        Args:
+            pincode: The pincode to fetch products for
+            categories: Categories to fetch
+            scrape: Scrapes one category and returns its products ([] on failure)
+
+        Returns:
+            List of Products, UNCHANGED if the API response matched the
+            previous one, or None if no tier could serve the check
+        """
+        api_result = self._fetch_api(pincode, categories)
+        if api_result is UNCHANGED or api_result:
+            session_lookups.inc(result="hit")
+            return api_result
+
+        reason = self._should_scrape(pincode, api_result)
+        if reason is None:
+            logger.info(f"API tier failed for pincode {pincode}; retrying it later")
+            return None
+        session_lookups.inc(result="miss")
+
+        # Take the slot first, so a half-open probe is not spent on a skip
+        if not self.acquire_scrape_slot():
+            fetch_tier_attempts.inc(tier=SCRAPE, result="busy")
+            logger.warning(
+                f"Skipping scrape for pincode {pincode} ({reason}): "
+                "all scrape slots are busy"
+            )
+            return None
+        breaker = self.breaker(SCRAPE, pincode)
+        if not breaker.allow():
+            self.release_scrape_slot()
+            fetch_tier_attempts.inc(tier=SCRAPE, result="circuit_open")
+            logger.warning(
+                f"Skipping scrape for pincode {pincode} ({reason}): "
+                f"circuit open for {breaker.retry_in():.0f}s"
+            )
+            return None
+
+        logger.info(f"Falling back to full website scraping ({reason})")
+        try:
+            started = time.monotonic()
+            # The browse page only loads one category, so cover the first one
+            items = scrape(pincode, categories[0])
+            elapsed = time.monotonic() - started
+        finally:
+            self.release_scrape_slot()
+
+        if items:
+            breaker.record_success(elapsed)
+            fetch_tier_attempts.inc(tier=SCRAPE, result="ok")
+            scrape_fallbacks.inc(result="ok")
+            logger.info(f"Full scraping successful - retrieved {len(items)} products")
+            return items
+        breaker.record_failure(elapsed)
+        fetch_tier_attempts.inc(tier=SCRAPE, result="failed")
+        scrape_fallbacks.inc(result="failed")
+        logger.error("Both API call and full scraping failed")
+        return None
+
+
+# Global instance
+fetch_strategy = FetchStrategy()
+
+for _tier in TIERS:
+    circuit_breakers_open.set_function(
+        lambda tier=_tier: fetch_strategy.open_count(tier), tier=_tier
+    )
+    fetch_tier_cost.set_function(
+        lambda tier=_tier: fetch_strategy.tier_cost(tier), tier=_tier
+    )
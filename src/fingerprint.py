@@ -0,0 +1,132 @@
+"""
+Response and item fingerprints for the Amul scraper application.
+
+Every products page is hashed as it is decoded. A page whose bytes match
+the previous response for the same pincode and URL reuses the earlier decoded
+payload, and a fetch where every page matched is reported as UNCHANGED so the
+caller skips diffing and database work. Items are fingerprinted on the fields
+the database stores, so only items that actually changed go downstream.
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from metrics import fetch_cycles
+from product import Product
+
+
+class Unchanged:
+    """Sentinel type for a fetch that matched the previous response."""
+
+    def __repr__(self) -> str:
+        return "UNCHANGED"
+
+
+# Returned instead of a product list when nothing changed upstream
+UNCHANGED = Unchanged()
+
+# What a products fetch returns: changed products, UNCHANGED, or None on failure
+FetchResult = Union[List[Product], Unchanged, None]
+
+# Item fields persisted by db.diff_items; other fields never trigger work
+ITEM_FIELDS = ("name", "available", "inventory_quantity")
+
+
+def payload_hasher() -> Any:
+    """Return a hasher for a short digest of a raw response body, fed chunk by chunk."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def item_digest(item: Product) -> Tuple:
+    """Return the comparable state of an item's persisted fields."""
+    return tuple(item.get(field) for field in ITEM_FIELDS)
+
+
+class FingerprintCache:
+    """Remembers page digests and item states per pincode."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages: Dict[Tuple[str, str], Tuple[bytes, Dict[str, Any]]] = {}
+        self._items: Dict[Tuple[str, str], Tuple] = {}
+        self.cycles = 0
+        self.cycles_skipped = 0
+        self.pages_unchanged = 0
+        self.items_filtered = 0
+
+    def cached_page(
+        self, pincode: str, url: str, digest: bytes
+    ) -> Optional[Dict[str, Any]]:
+        """Return the decoded payload if this page is byte-for-byte unchanged."""
+        with self._lock:
+            entry = self._pages.get((pincode, url))
+            if entry is None or entry[0] != digest:
+                return None
+            self.pages_unchanged += 1
+            return entry[1]
+
+    def store_page(
+        self, pincode: str, url: str, digest: bytes, payload: Dict[str, Any]
+    ) -> None:
+        """Remember a freshly decoded page."""
+        with self._lock:
+            self._pages[(pincode, url)] = (digest, payload)
+
+    def changed_items(
+        self, pincode: str, items: List[Product]
+    ) -> List[Product]:
+        """Return the items whose persisted fields changed since the last call.
+
+        Args:
+            pincode: The pincode the items were fetched for
+            items: Every product from the latest response
+
+        Returns:
+            The subset of items that needs diffing against the database
+        """
+        changed = []
+        with self._lock:
+            for item in items:
+                key = (pincode, item.id)
+                digest = item_digest(item)
+                if self._items.get(key) == digest:
+                    continue
+                self._items[key] = digest
+                changed.append(item)
+            self.items_filtered += len(items) - len(changed)
+        return changed
+
+    def record_cycle(self, skipped: bool) -> None:
+        """Count a completed fetch and whether its downstream work was skipped."""
+        with self._lock:
+            self.cycles += 1
+            if skipped:
+                self.cycles_skipped += 1
+        fetch_cycles.inc(result="skipped" if skipped else "changed")
+
+    def forget(self, pincode: str) -> None:
+        """Drop every fingerprint for a pincode so the next fetch is processed in full.
+
+        Called when downstream work failed, so items filtered out later are
+        never ones the database has not seen.
+        """
+        with self._lock:
+            for key in [k for k in self._pages if k[0] == pincode]:
+                del self._pages[key]
+            for key in [k for k in self._items if k[0] == pincode]:
+                del self._items[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cycle, page and item counters."""
+        with self._lock:
+            return {
+                "cycles": self.cycles,
+                "cycles_skipped": self.cycles_skipped,
+                "pages_unchanged": self.pages_unchanged,
+                "items_filtered": self.items_filtered,
+            }
+
+
+# Global instance
+fingerprints = FingerprintCache()
@@ -1,35 +1,119 @@
-import requests
-from logger import default_logger as logger
+import argparse
 import time
+from typing import Dict
+
 import config
-from db import update_db_and_notify, init_db
-from scraper import get_amul_data
+from capture import close_capture
+from db import close_db, init_db, read_current_stock
+from logger import default_logger as logger
+from monitor import PincodeMonitor
+from notification import notification_queue
+from scraper import scrape_pool
+from subscriptions import subscription_store
+
 
+def _log_startup(phases: Dict[str, float]) -> None:
+    """Log how long each startup phase took."""
+    breakdown = ", ".join(
+        f"{name} {seconds * 1000:.0f} ms" for name, seconds in phases.items()
+    )
+    logger.info(f"Startup: {breakdown}; ready in {sum(phases.values()) * 1000:.0f} ms")
 
-def run() -> None:
-    """Main execution loop."""
+
+def run(once: bool = False) -> None:
+    """Main execution loop.
+
+    Args:
+        once: Check every pincode and category once, flush notifications and exit
+    """
+    run_started = time.perf_counter()
+    phases: Dict[str, float] = {}
+    started = run_started
     init_db()
-    while True:
-        try:
-            api_data = get_amul_data(config.PINCODE)
-            if api_data:
-                update_db_and_notify(api_data)
-            else:
-                logger.warning("API returned no data.")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
-        except KeyError:
-            logger.error(
-                "Could not find 'data' key in API response. Response format may have changed."
+    phases["database"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    subscription_store.load()
+    if config.SUBSCRIPTIONS_FILE:
+        subscription_store.import_file(config.SUBSCRIPTIONS_FILE)
+    phases["subscriptions"] = time.perf_counter() - started
+
+    # Resume email left in the outbox by a previous run, before any new check
+    started = time.perf_counter()
+    notification_queue.start()
+    phases["notifications"] = time.perf_counter() - started
+
+    # One-shot runs skip the long-lived helpers, and none of them is even
+    # imported unless it is enabled
+    started = time.perf_counter()
+    metrics_server = None
+    if config.METRICS_ENABLED and not once:
+        from metrics import MetricsServer, registry
+
+        metrics_server = MetricsServer(registry)
+        metrics_server.start()
+    stock_server = None
+    if config.STOCK_API_ENABLED and not once:
+        from stock_api import StockAPIServer, stock_snapshot
+
+        stock_snapshot.load(read_current_stock())
+        stock_server = StockAPIServer(stock_snapshot)
+        stock_server.start()
+    work_queue = None
+    if config.WORK_QUEUE_BACKEND and not once:
+        from work_queue import create_work_queue
+
+        work_queue = create_work_queue()
+    monitor = PincodeMonitor(config.PINCODES, work_queue=work_queue)
+    if work_queue:
+        work_queue.start(list(monitor.scheduler.schedules))
+    harvester = None
+    if config.SESSION_HARVESTER_ENABLED and not once:
+        from scraper import start_session_harvest
+        from session_pool import SessionHarvester
+
+        harvester = SessionHarvester(config.PINCODES, start_session_harvest)
+        harvester.start()
+    phases["services"] = time.perf_counter() - started
+    _log_startup(phases)
+
+    try:
+        if once:
+            started = time.perf_counter()
+            monitor.run_once()
+            logger.info(
+                f"Single cycle finished in {(time.perf_counter() - started) * 1000:.0f} ms"
             )
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
+        else:
+            monitor.run_forever()
+    finally:
+        if harvester:
+            harvester.stop()
+        monitor.stop()
+        if work_queue:
+            work_queue.stop()
+        scrape_pool.shutdown()
+        notification_queue.stop()
+        close_db()
+        close_capture()
+        if stock_server:
+            stock_server.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if once:
+            logger.info(f"Exiting after {(time.perf_counter() - run_started) * 1000:.0f} ms")
+
 
-        logger.info(
-            f"Waiting for {config.CHECK_INTERVAL_SECONDS} seconds before next check..."
-        )
-        time.sleep(config.CHECK_INTERVAL_SECONDS)
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Monitor Amul product stock")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="check every pincode once and exit, for cron or short-lived containers",
+    )
+    args = parser.parse_args()
+    run(once=args.once)
 
 
 if __name__ == "__main__":
-    run()
+    main()
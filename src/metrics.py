@@ -0,0 +1,386 @@
+"""
+In-process metrics for the Amul scraper application.
+
+Counters, gauges and histograms are kept in a small registry and served in
+the Prometheus text format from a local HTTP endpoint, so stage latencies and
+throughput can be scraped without pulling in a client library.
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import config
+from logger import default_logger as logger
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; spans a single API page up to a slow Playwright fallback
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Seconds from queueing an email to delivering it, including retries
+NOTIFICATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Render a label set as {a="x",b="y"}, or nothing when empty."""
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, keeping integers free of a trailing .0."""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    """Shared label handling and callback support for every metric type."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        """Return label values in declaration order, rejecting unknown labels."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Read this series from a callback at scrape time instead of storing it."""
+        with self._lock:
+            self._functions[self._key(labels)] = function
+
+    def _function_samples(self) -> List[Tuple[LabelValues, float]]:
+        """Evaluate callback series, skipping any that raise."""
+        with self._lock:
+            functions = list(self._functions.items())
+        samples = []
+        for key, function in functions:
+            try:
+                samples.append((key, float(function())))
+            except Exception as e:
+                logger.debug(f"Metric callback for {self.name} failed: {e}")
+        return samples
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Return the exposition lines for every series of this metric."""
+
+    def render(self) -> str:
+        """Return the HELP/TYPE header and every sample line."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Unlabelled counters report 0 before their first increment
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Add a non-negative amount to the series for these labels."""
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Return the current value of one series."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        values.update(self._function_samples())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, such as a queue depth."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the series for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        values.update(self._function_samples())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: ([count per bucket, +Inf last], sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe how long the wrapped block takes, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._series.items()
+            ]
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them for the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry on /metrics."""
+
+    registry: MetricsRegistry
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        """Keep scrapes out of the application log."""
+
+
+class MetricsServer:
+    """Background HTTP server exposing a registry to Prometheus.
+
+    Args:
+        registry: Metrics to serve
+        host: Interface to bind (defaults to config.METRICS_HOST)
+        port: Port to bind (defaults to config.METRICS_PORT; 0 picks a free one)
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        host: str = config.METRICS_HOST,
+        port: int = config.METRICS_PORT,
+    ):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Bind the port and serve on a daemon thread."""
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Global instance
+registry = MetricsRegistry()
+
+# Application metrics
+stage_seconds = registry.histogram(
+    "amul_stage_duration_seconds",
+    "Time spent in each stage of a check",
+    ["stage"],
+)
+session_lookups = registry.counter(
+    "amul_session_lookups_total",
+    "Checks served from a pooled session (hit) or needing a scrape (miss)",
+    ["result"],
+)
+scrape_fallbacks = registry.counter(
+    "amul_scrape_fallbacks_total",
+    "Playwright scrapes run because the API path could not serve a check",
+    ["result"],
+)
+fetch_tier_attempts = registry.counter(
+    "amul_fetch_tier_attempts_total",
+    "Calls per fetch tier by outcome, including skips for open circuits or busy slots",
+    ["tier", "result"],
+)
+fetch_tier_cost = registry.gauge(
+    "amul_fetch_tier_cost_seconds", "Smoothed seconds per call of each fetch tier", ["tier"]
+)
+circuit_breakers_open = registry.gauge(
+    "amul_circuit_breakers_open",
+    "Pincodes whose circuit breaker for a fetch tier is not closed",
+    ["tier"],
+)
+fetch_cycles = registry.counter(
+    "amul_fetch_cycles_total",
+    "API fetches, by whether downstream work was skipped as unchanged",
+    ["result"],
+)
+items_changed = registry.counter(
+    "amul_items_changed_total", "Stock rows whose name, quantity or availability changed"
+)
+restocks = registry.counter(
+    "amul_restocks_total", "Items that went from unavailable to available"
+)
+notifications = registry.counter(
+    "amul_notifications_total", "Email delivery attempts by outcome", ["result"]
+)
+notification_latency = registry.histogram(
+    "amul_notification_latency_seconds",
+    "Time from queueing an email to delivering it",
+    buckets=NOTIFICATION_BUCKETS,
+)
+queue_depth = registry.gauge(
+    "amul_queue_depth", "Items waiting in each internal queue", ["queue"]
+)
+scrape_worker_restarts = registry.counter(
+    "amul_scrape_worker_restarts_total",
+    "Scrape worker processes replaced, by reason",
+    ["reason"],
+)
+work_leases_held = registry.gauge(
+    "amul_work_leases_held", "Shared targets this instance currently holds a lease on"
+)
+http_requests = registry.counter(
+    "amul_http_requests_total", "Requests sent over the pooled HTTP transport"
+)
+http_new_connections = registry.counter(
+    "amul_http_new_connections_total", "TCP/TLS connections opened by the HTTP transport"
+)
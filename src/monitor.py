@@ -0,0 +1,384 @@
+"""
+Concurrent multi-pincode monitoring for the Amul scraper application.
+
+Checks run as a pipeline of asyncio stages joined by bounded queues:
+
+    schedule -> fetch -> diff -> persist -> notify
+
+Fetches run on a worker pool; diffing, SQLite writes and notification
+queueing each run on their own thread. A slow disk or mail server therefore
+only fills its stage's queue instead of delaying the next poll, and the
+bounded queues push back on the stages before them once they are full.
+
+With a WorkQueue, targets are shared with other monitor instances: a due
+target is only fetched once its lease is taken, and the lease is given back
+with the next due time once the target's changes are on disk, so the next
+instance to poll it diffs against what was written.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import requests
+
+import config
+from api_client import api_client
+from db import invalidate_stock_cache, refresh_stock_cache, stage_changes, write_changes
+from fingerprint import UNCHANGED, FetchResult, fingerprints
+from logger import default_logger as logger
+from metrics import queue_depth, stage_seconds
+from notification import send_consolidated_notification
+from scheduler import AdaptiveScheduler, Target, TargetSchedule
+from scraper import get_amul_data
+
+if TYPE_CHECKING:
+    from work_queue import WorkQueue
+
+
+class PincodeMonitor:
+    """Checks many (pincode, category) targets through a staged pipeline.
+
+    Every target is scheduled independently by an AdaptiveScheduler: it is
+    resubmitted once its own check has been diffed and its adaptive interval
+    has elapsed, so a slow pincode or a Playwright fallback never delays the
+    others.
+    """
+
+    def __init__(
+        self,
+        pincodes: List[str],
+        categories: Optional[List[str]] = None,
+        max_workers: int = config.MAX_WORKERS,
+        interval: float = config.CHECK_INTERVAL_SECONDS,
+        queue_size: int = config.PIPELINE_QUEUE_SIZE,
+        work_queue: Optional["WorkQueue"] = None,
+    ):
+        categories = categories or config.CATEGORIES
+        self.max_workers = max(1, max_workers)
+        self.queue_size = max(1, queue_size)
+        self.work_queue = work_queue
+        self.scheduler = AdaptiveScheduler(
+            [(pincode, category) for pincode in pincodes for category in categories],
+            base_interval=interval,
+        )
+        self._fetch_executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="fetch"
+        )
+        self._diff_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diff")
+        self._persist_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="persist"
+        )
+        self._notify_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="notify"
+        )
+        # Only touched from the event loop thread
+        self._in_flight: Set[Target] = set()
+        # Targets whose lease this instance holds
+        self._leased: Set[Target] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    # Blocking work, run on the executors
+
+    def _fetch(self, schedule: TargetSchedule) -> FetchResult:
+        """Fetch products for one target; returns None if the check failed."""
+        pincode, category = schedule.key
+        try:
+            api_data = get_amul_data(pincode, [category])
+            if api_data is UNCHANGED:
+                return api_data
+            if not api_data:
+                logger.warning(
+                    f"API returned no data for pincode {pincode}, category {category}"
+                )
+                return None
+            return api_data
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API request failed for pincode {pincode}: {e}")
+        except KeyError:
+            logger.error(
+                "Could not find 'data' key in API response. Response format may have changed."
+            )
+        except Exception as e:
+            logger.error(f"An unexpected error occurred for pincode {pincode}: {e}")
+        # Process the next response in full in case this one was half-handled
+        fingerprints.forget(pincode)
+        return None
+
+    def _persist(self, pincode: str, changes: List[Tuple]) -> bool:
+        """Write one batch of changes; returns False if the write failed."""
+        try:
+            write_changes(changes)
+            logger.info(
+                f"Database updated with {len(changes)} changes for pincode {pincode}."
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Database update failed for pincode {pincode}: {e}")
+            # Reload the mirror so the lost changes are diffed again next time
+            invalidate_stock_cache()
+            fingerprints.forget(pincode)
+            return False
+
+    # Pipeline stages, run on the event loop
+
+    def _release(self, key: Target, delay: float) -> None:
+        """Give a target's lease back to the work queue, due again after delay."""
+        if self.work_queue is None or key not in self._leased:
+            return
+        self._leased.discard(key)
+        interval = self.scheduler.schedules[key].interval
+        self._loop.run_in_executor(None, self.work_queue.release, key, interval, delay)
+        self._wakeup.set()
+
+    def _finish(
+        self, schedule: TargetSchedule, result: Optional[Tuple[int, int]]
+    ) -> None:
+        """Reschedule a target once its changes are written or its check has failed.
+
+        Args:
+            schedule: The target that was checked
+            result: (changed, restocked) counts, or None if the check failed
+        """
+        if result is None:
+            delay = self.scheduler.record_error(schedule.key)
+            outcome = f"failed, retry in ~{delay:.0f}s"
+        else:
+            delay = self.scheduler.record_success(schedule.key, *result)
+            outcome = f"{result[0]} changed, next in ~{delay:.0f}s"
+        self._in_flight.discard(schedule.key)
+        self._release(schedule.key, delay)
+        logger.info(
+            f"Pincode {schedule.pincode} ({schedule.category}) checked in "
+            f"{schedule.last_duration:.2f}s ({outcome})"
+        )
+        self._wakeup.set()
+
+    async def _claim(self, due: List[TargetSchedule]) -> List[TargetSchedule]:
+        """Lease as many due targets as there are free fetch workers.
+
+        Targets held or recently polled by another instance are deferred until
+        they may become available.
+        """
+        budget = self.max_workers - len(self._in_flight)
+        if budget <= 0:
+            return []
+        try:
+            claimed, waits = await self._loop.run_in_executor(
+                None, self.work_queue.claim, [s.key for s in due], budget
+            )
+        except Exception as e:
+            logger.error(f"Failed to lease targets: {e}")
+            for schedule in due:
+                self.scheduler.defer(schedule.key, self.work_queue.heartbeat_seconds)
+            return []
+
+        for key, wait in waits.items():
+            self.scheduler.defer(key, wait)
+        leased = []
+        for schedule in due:
+            if schedule.key not in claimed:
+                continue
+            interval, handed_over = claimed[schedule.key]
+            if interval:
+                self.scheduler.adopt_interval(schedule.key, interval)
+            if handed_over and not any(k[0] == schedule.pincode for k in self._leased):
+                # Another instance wrote this pincode since we last saw it
+                fingerprints.forget(schedule.pincode)
+                await self._loop.run_in_executor(
+                    self._diff_executor, refresh_stock_cache, schedule.pincode
+                )
+            self._leased.add(schedule.key)
+            leased.append(schedule)
+        return leased
+
+    async def _schedule_stage(self, fetch_queue: asyncio.Queue, once: bool) -> None:
+        """Queue due targets for fetching, sleeping until the next one is due."""
+        while not self._stopping:
+            now = float("inf") if once else self._loop.time()
+            # The loop clock is time.monotonic(), which the scheduler also uses
+            # Leased targets stay busy until their changes are written
+            busy = self._in_flight | self._leased
+            due = self.scheduler.due(now, exclude=busy)
+            if self.work_queue is not None and not once and due:
+                due = await self._claim(due)
+            for schedule in due:
+                self._in_flight.add(schedule.key)
+                await fetch_queue.put(schedule)
+            if once:
+                return
+
+            delay = self.scheduler.seconds_until_next(
+                exclude=self._in_flight | self._leased
+            )
+            if self.work_queue is not None and len(self._in_flight) >= self.max_workers:
+                # Leases are only taken for free fetch workers; wait for one
+                delay = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fetch_stage(
+        self, fetch_queue: asyncio.Queue, diff_queue: asyncio.Queue
+    ) -> None:
+        """Fetch targets on the worker pool and hand changed items to diffing."""
+        while True:
+            schedule = await fetch_queue.get()
+            try:
+                started = self._loop.time()
+                items = await self._loop.run_in_executor(
+                    self._fetch_executor, self._fetch, schedule
+                )
+                schedule.last_duration = self._loop.time() - started
+                stage_seconds.observe(schedule.last_duration, stage="fetch")
+                if items is UNCHANGED:
+                    self._finish(schedule, (0, 0))
+                elif items is None:
+                    self._finish(schedule, None)
+                else:
+                    schedule.last_item_count = len(items)
+                    await diff_queue.put((schedule, items))
+            finally:
+                fetch_queue.task_done()
+
+    async def _diff_stage(
+        self, diff_queue: asyncio.Queue, persist_queue: asyncio.Queue
+    ) -> None:
+        """Diff items against the stock mirror and queue the changes for writing."""
+        while True:
+            schedule, items = await diff_queue.get()
+            try:
+                try:
+                    changes, restocks = await self._loop.run_in_executor(
+                        self._diff_executor, stage_changes, schedule.pincode, items
+                    )
+                except Exception as e:
+                    logger.error(f"Diff failed for pincode {schedule.pincode}: {e}")
+                    fingerprints.forget(schedule.pincode)
+                    self._finish(schedule, None)
+                    continue
+
+                if changes:
+                    # Rescheduled by the persist stage once the write is done
+                    await persist_queue.put((schedule, changes, restocks))
+                else:
+                    self._finish(schedule, (0, 0))
+            finally:
+                diff_queue.task_done()
+
+    async def _persist_stage(
+        self, persist_queue: asyncio.Queue, notify_queue: asyncio.Queue
+    ) -> None:
+        """Write changes to SQLite, then release their restocks for notification."""
+        while True:
+            schedule, changes, restocks = await persist_queue.get()
+            try:
+                written = await self._loop.run_in_executor(
+                    self._persist_executor, self._persist, schedule.pincode, changes
+                )
+                if not written:
+                    # _persist dropped the fingerprints; retry on the error backoff
+                    self._finish(schedule, None)
+                    continue
+                self._finish(schedule, (len(changes), len(restocks)))
+                # Restocks are only announced once they are on disk
+                if restocks:
+                    await notify_queue.put(restocks)
+            finally:
+                persist_queue.task_done()
+
+    async def _notify_stage(self, notify_queue: asyncio.Queue) -> None:
+        """Hand restocked items to the notification queue."""
+        while True:
+            restocks: List[Dict[str, Any]] = await notify_queue.get()
+            try:
+                with stage_seconds.time(stage="notify"):
+                    await self._loop.run_in_executor(
+                        self._notify_executor, send_consolidated_notification, restocks
+                    )
+            except Exception as e:
+                logger.error(f"Failed to queue restock notification: {e}")
+            finally:
+                notify_queue.task_done()
+
+    async def _run(self, once: bool) -> None:
+        """Run the pipeline until stopped, or until one full pass when once is set."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+        fetch_queue, diff_queue, persist_queue, notify_queue = queues
+        for name, queue in zip(("fetch", "diff", "persist", "notify"), queues):
+            queue_depth.set_function(queue.qsize, queue=name)
+
+        workers = [
+            asyncio.create_task(self._fetch_stage(fetch_queue, diff_queue))
+            for _ in range(self.max_workers)
+        ]
+        workers += [
+            asyncio.create_task(self._diff_stage(diff_queue, persist_queue)),
+            asyncio.create_task(self._persist_stage(persist_queue, notify_queue)),
+            asyncio.create_task(self._notify_stage(notify_queue)),
+        ]
+        try:
+            await self._schedule_stage(fetch_queue, once)
+            # Drain every stage in order so nothing fetched is left unwritten
+            for queue in queues:
+                await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def _request_stop(self) -> None:
+        """Stop scheduling; runs on the event loop."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def run_once(self) -> None:
+        """Check every target once and wait until its results are written."""
+        asyncio.run(self._run(once=True))
+
+    def run_forever(self) -> None:
+        """Keep every target on its own schedule until stop() is called."""
+        logger.info(
+            f"Monitoring {len(self.scheduler.schedules)} targets with "
+            f"{self.max_workers} fetch workers"
+        )
+        asyncio.run(self._run(once=False))
+
+    def stop(self) -> None:
+        """Stop scheduling new checks and wait for running ones to finish.
+
+        Called from another thread while the pipeline runs, this only asks
+        run_forever to drain and return; call it again afterwards to release
+        the worker threads.
+        """
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._request_stop)
+            return
+        self._stopping = True
+        for executor in (
+            self._fetch_executor,
+            self._diff_executor,
+            self._persist_executor,
+            self._notify_executor,
+        ):
+            executor.shutdown(wait=True)
+        stats = api_client.connection_stats()
+        logger.info(
+            f"HTTP transport: {stats['requests']} requests, "
+            f"{stats['new_connections']} new connections, "
+            f"{stats['reuse_ratio']:.0%} reused"
+        )
+        cycles = fingerprints.snapshot()
+        logger.info(
+            f"Fetch cycles: {cycles['cycles']} total, {cycles['cycles_skipped']} skipped "
+            f"unchanged, {cycles['pages_unchanged']} pages reused, "
+            f"{cycles['items_filtered']} items filtered"
+        )
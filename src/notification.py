@@ -1,29 +1,111 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 from logger import default_logger as logger
+from metrics import notification_latency, notifications, queue_depth, stage_seconds
+from subscriptions import subscription_store
 from config import (
     EMAIL_ENABLED,
     SMTP_SERVER,
     SMTP_PORT,
+    SMTP_STARTTLS,
     EMAIL_FROM,
     EMAIL_PASSWORD,
     EMAIL_TO,
     EMAIL_SUBJECT,
+    NOTIFICATION_MAX_ATTEMPTS,
+    NOTIFICATION_RETRY_BASE_SECONDS,
+    OUTBOX_DIR,
+    SMTP_IDLE_CHECK_SECONDS,
 )
 
+# smtplib and the email package are imported on first send, not at startup
+if TYPE_CHECKING:
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
 
-def send_email(subject: str, body: str, to_emails: list[str]) -> bool:
-    """Sends an email notification.
 
-    Args:
-        subject: Email subject
-        body: Email body content
-        to_emails: List of recipient email addresses
+class SMTPConnection:
+    """One authenticated SMTP connection, reused across messages.
 
-    Returns:
-        bool: True if email sent successfully, False otherwise
+    The connection is opened lazily, checked with NOOP when it has been idle
+    for a while, and re-established only when the server has dropped it.
     """
+
+    def __init__(self):
+        self._server: Optional["smtplib.SMTP"] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> "smtplib.SMTP":
+        """Open, secure and authenticate a new SMTP session."""
+        import smtplib
+
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()  # Enable security
+        server.login(EMAIL_FROM, EMAIL_PASSWORD)
+        logger.info(f"Opened SMTP connection to {SMTP_SERVER}:{SMTP_PORT}")
+        return server
+
+    def _is_alive(self) -> bool:
+        """Return False if an idle connection no longer answers NOOP."""
+        if time.monotonic() - self._last_used < SMTP_IDLE_CHECK_SECONDS:
+            return True
+        import smtplib
+
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, msg: "MIMEMultipart") -> None:
+        """Send a message, reconnecting once if the connection went stale."""
+        import smtplib
+
+        if self._server is not None and not self._is_alive():
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.close()
+            self._server = self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        """Close the connection if it is open."""
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+def _build_message(subject: str, body: str, to_emails: list[str]) -> "MIMEMultipart":
+    """Builds the MIME message for an email notification."""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart()
+    msg["From"] = EMAIL_FROM
+    msg["To"] = ", ".join(to_emails)
+    msg["Subject"] = subject
+
+    # Add body to email
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
+
+def _check_email_config(to_emails: list[str]) -> bool:
+    """Logs and returns False if email cannot be sent with the current settings."""
     if not EMAIL_FROM or not EMAIL_PASSWORD:
         logger.warning(
             "Email credentials not configured. Please set EMAIL_FROM and EMAIL_PASSWORD in config.py"
@@ -35,29 +117,268 @@ def send_email(subject: str, body: str, to_emails: list[str]) -> bool:
             "No recipient email addresses configured. Please set EMAIL_TO in config.py"
         )
         return False
+    return True
 
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg["From"] = EMAIL_FROM
-        msg["To"] = ", ".join(to_emails)
-        msg["Subject"] = subject
 
-        # Add body to email
-        msg.attach(MIMEText(body, "plain"))
+def send_email(subject: str, body: str, to_emails: list[str]) -> bool:
+    """Sends an email notification synchronously on a fresh connection.
 
-        # Create SMTP session
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()  # Enable security
-            server.login(EMAIL_FROM, EMAIL_PASSWORD)
-            server.send_message(msg)
+    The monitor itself queues email through ``queue_email``; this remains for
+    one-off sends.
+
+    Args:
+        subject: Email subject
+        body: Email body content
+        to_emails: List of recipient email addresses
+
+    Returns:
+        bool: True if email sent successfully, False otherwise
+    """
+    if not _check_email_config(to_emails):
+        return False
 
+    connection = SMTPConnection()
+    try:
+        connection.send(_build_message(subject, body, to_emails))
         logger.info(f"Email notification sent successfully to {', '.join(to_emails)}")
         return True
 
     except Exception as e:
         logger.error(f"Failed to send email notification: {str(e)}")
         return False
+    finally:
+        connection.close()
+
+
+class Outbox:
+    """Durable on-disk queue of pending email messages.
+
+    Each message is one JSON file, written atomically, and removed only once
+    it has been sent, so queued alerts survive restarts.
+    """
+
+    def __init__(self, directory: str = OUTBOX_DIR):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+
+    def _ensure_dirs(self) -> None:
+        """Create the outbox directories if they don't exist."""
+        os.makedirs(self.failed_directory, exist_ok=True)
+
+    def _path(self, message_id: str) -> str:
+        """Return the file path of a queued message."""
+        return os.path.join(self.directory, f"{message_id}.json")
+
+    def save(self, message: Dict[str, Any]) -> None:
+        """Write or overwrite a message atomically."""
+        self._ensure_dirs()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(message, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(message["id"]))
+
+    def remove(self, message_id: str) -> None:
+        """Delete a message that has been delivered."""
+        try:
+            os.remove(self._path(message_id))
+        except FileNotFoundError:
+            pass
+
+    def mark_failed(self, message_id: str) -> None:
+        """Move a message that exhausted its retries out of the pending set."""
+        self._ensure_dirs()
+        try:
+            os.replace(
+                self._path(message_id),
+                os.path.join(self.failed_directory, f"{message_id}.json"),
+            )
+        except FileNotFoundError:
+            pass
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Load every message still waiting to be sent."""
+        self._ensure_dirs()
+        messages = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json") or name.startswith("."):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r") as f:
+                    messages.append(json.load(f))
+            except Exception as e:
+                logger.error(f"Skipping unreadable outbox message {name}: {e}")
+        return messages
+
+
+class NotificationQueue:
+    """Sends queued email on a dedicated thread over one reused SMTP connection.
+
+    Failed sends are retried with exponential backoff up to
+    NOTIFICATION_MAX_ATTEMPTS times; the outbox keeps every message until
+    it is delivered or gives up.
+    """
+
+    def __init__(self, outbox: Optional[Outbox] = None):
+        self.outbox = outbox or Outbox()
+        self._connection = SMTPConnection()
+        self._schedule: List[Tuple[float, str]] = []
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the sender thread and requeue anything left in the outbox."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            for message in self.outbox.pending():
+                self._schedule_locked(message)
+            if self._messages:
+                logger.info(f"Resuming {len(self._messages)} queued notifications")
+            self._thread = threading.Thread(
+                target=self._run, name="notification-sender", daemon=True
+            )
+            self._thread.start()
+
+    def _schedule_locked(self, message: Dict[str, Any]) -> None:
+        """Schedule a message at its next attempt time; caller holds the lock."""
+        self._messages[message["id"]] = message
+        heapq.heappush(self._schedule, (message["next_attempt"], message["id"]))
+        self._cond.notify()
+
+    def enqueue(self, subject: str, body: str, to_emails: list[str]) -> str:
+        """Persist a message to the outbox and hand it to the sender thread.
+
+        Returns:
+            The queued message ID
+        """
+        now = time.time()
+        message = {
+            "id": f"{int(now * 1000):013d}-{uuid.uuid4().hex[:8]}",
+            "subject": subject,
+            "body": body,
+            "to": list(to_emails),
+            "attempts": 0,
+            "next_attempt": now,
+            "created_at": now,
+        }
+        # Start first so the resumed outbox scan cannot pick this message up twice
+        self.start()
+        self.outbox.save(message)
+        with self._cond:
+            self._schedule_locked(message)
+        return message["id"]
+
+    def depth(self) -> int:
+        """Return how many messages are waiting to be sent."""
+        with self._cond:
+            return len(self._messages)
+
+    def _next_due(self) -> Optional[Dict[str, Any]]:
+        """Block until a message is due, or return None once stopping.
+
+        When stopping, only messages that are already due are returned;
+        those still backing off stay in the outbox for the next start.
+        """
+        with self._cond:
+            while True:
+                if self._schedule:
+                    due, message_id = self._schedule[0]
+                    wait = due - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self._schedule)
+                        return self._messages.get(message_id)
+                if self._stopping:
+                    self._schedule.clear()
+                    self._messages.clear()
+                    return None
+                self._cond.wait(timeout=wait if self._schedule else None)
+
+    def _deliver(self, message: Dict[str, Any]) -> None:
+        """Try to send one message, rescheduling or giving up on failure."""
+        try:
+            with stage_seconds.time(stage="smtp_send"):
+                self._connection.send(
+                    _build_message(message["subject"], message["body"], message["to"])
+                )
+            notifications.inc(result="sent")
+            notification_latency.observe(
+                time.time() - message.get("created_at", message["next_attempt"])
+            )
+            logger.info(f"Email notification sent successfully to {', '.join(message['to'])}")
+            self.outbox.remove(message["id"])
+            with self._cond:
+                self._messages.pop(message["id"], None)
+            return
+        except Exception as e:
+            self._connection.close()
+            notifications.inc(result="error")
+            message["attempts"] += 1
+            logger.error(
+                f"Failed to send email notification (attempt {message['attempts']}): {str(e)}"
+            )
+
+        with self._cond:
+            if message["attempts"] >= NOTIFICATION_MAX_ATTEMPTS:
+                logger.error(f"Giving up on notification {message['id']}")
+                notifications.inc(result="gave_up")
+                self.outbox.mark_failed(message["id"])
+                self._messages.pop(message["id"], None)
+                return
+            delay = NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (message["attempts"] - 1)
+            message["next_attempt"] = time.time() + delay
+            self.outbox.save(message)
+            self._schedule_locked(message)
+
+    def _run(self) -> None:
+        """Sender thread: deliver messages as they fall due."""
+        while True:
+            message = self._next_due()
+            if message is None:
+                break
+            self._deliver(message)
+        self._connection.close()
+
+    def stop(self, timeout: float = 30) -> None:
+        """Flush due messages and stop; unsent ones stay in the outbox."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout=timeout)
+        with self._cond:
+            self._thread = None
+
+
+# Global instance
+notification_queue = NotificationQueue()
+queue_depth.set_function(notification_queue.depth, queue="notifications")
+
+
+def queue_email(subject: str, body: str, to_emails: list[str]) -> bool:
+    """Queues an email for background delivery.
+
+    Args:
+        subject: Email subject
+        body: Email body content
+        to_emails: List of recipient email addresses
+
+    Returns:
+        bool: True if the message was queued, False if email is misconfigured
+    """
+    if not _check_email_config(to_emails):
+        return False
+    try:
+        notification_queue.enqueue(subject, body, to_emails)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to queue email notification: {str(e)}")
+        return False
 
 
 def send_notification(name: str, quantity: int) -> None:
@@ -85,7 +406,7 @@ Don't miss out - get it while it's available!
 This is an automated notification from your Amul stock monitoring system.
         """
 
-        success = send_email(
+        success = queue_email(
             subject=f"{name} {EMAIL_SUBJECT}", body=email_body, to_emails=EMAIL_TO
         )
 
@@ -95,28 +416,22 @@ This is an automated notification from your Amul stock monitoring system.
         logger.info("Email notifications are disabled")
 
 
-def send_consolidated_notification(items: list[dict]) -> None:
-    """Sends a consolidated notification about multiple items being back in stock.
+def _build_digest(items: list[dict]) -> Tuple[str, str]:
+    """Builds the subject and body of a restock email for one recipient.
 
     Args:
         items: List of dictionaries with 'name' and 'quantity' keys for each item
-    """
-    if not items:
-        return
-
-    # Log all items individually
-    for item in items:
-        message = f"✅ BACK IN STOCK: {item['name']} is now available!\n   Quantity: {item['quantity']}"
-        logger.info(message)
 
-    # Send consolidated email notification if enabled
-    if EMAIL_ENABLED:
-        if len(items) == 1:
-            # If only one item, use the original single-item format
-            item = items[0]
-            email_body = f"""Good news!
+    Returns:
+        Tuple of (subject, body)
+    """
+    if len(items) == 1:
+        # If only one item, use the original single-item format
+        item = items[0]
+        location = f" (pincode {item['pincode']})" if item.get("pincode") else ""
+        email_body = f"""Good news!
 
-The product "{item["name"]}" is now back in stock on Amul's website.
+The product "{item["name"]}" is now back in stock on Amul's website{location}.
 
 Details:
 • Product: {item["name"]}
@@ -126,15 +441,19 @@ Don't miss out - get it while it's available!
 
 This is an automated notification from your Amul stock monitoring system.
             """
-            subject = f"{item['name']} {EMAIL_SUBJECT}"
-        else:
-            # Multiple items - create consolidated notification
-            item_list = "\n".join(
-                [f"• {item['name']} (Quantity: {item['quantity']})" for item in items]
-            )
-            total_items = len(items)
+        return f"{item['name']} {EMAIL_SUBJECT}", email_body
+
+    # Multiple items - create consolidated notification
+    item_list = "\n".join(
+        [
+            f"• {item['name']} (Quantity: {item['quantity']}"
+            + (f", pincode {item['pincode']})" if item.get("pincode") else ")")
+            for item in items
+        ]
+    )
+    total_items = len(items)
 
-            email_body = f"""Great news!
+    email_body = f"""Great news!
 
 {total_items} products are now back in stock on Amul's website:
 
@@ -144,13 +463,46 @@ Don't miss out - get them while they're available!
 
 This is an automated notification from your Amul stock monitoring system.
             """
-            subject = f"{total_items} Products {EMAIL_SUBJECT}"
+    return f"{total_items} Products {EMAIL_SUBJECT}", email_body
 
-        success = send_email(subject=subject, body=email_body, to_emails=EMAIL_TO)
 
-        if not success:
+def send_consolidated_notification(items: list[dict]) -> None:
+    """Sends each subscriber one consolidated notification about their restocked items.
+
+    Items are routed through the subscription index; addresses in EMAIL_TO
+    receive every restock.
+
+    Args:
+        items: List of dictionaries with 'name' and 'quantity' keys for each item,
+            plus 'pincode' and 'product_id' for routing
+    """
+    if not items:
+        return
+
+    # Log all items individually
+    for item in items:
+        message = f"✅ BACK IN STOCK: {item['name']} is now available!\n   Quantity: {item['quantity']}"
+        logger.info(message)
+
+    # Send consolidated email notification if enabled
+    if EMAIL_ENABLED:
+        digests = subscription_store.route(items, default_recipients=EMAIL_TO)
+        if not digests:
+            logger.warning(
+                "No subscribers for restocked items. Please set EMAIL_TO or add subscriptions"
+            )
+            return
+
+        failed = 0
+        for recipient, recipient_items in digests.items():
+            subject, email_body = _build_digest(recipient_items)
+            if not queue_email(subject=subject, body=email_body, to_emails=[recipient]):
+                failed += 1
+
+        if failed:
             logger.warning(
-                "Consolidated email notification failed - check email configuration"
+                f"Consolidated email notification failed for {failed} of {len(digests)} "
+                "recipients - check email configuration"
             )
     else:
         logger.info("Email notifications are disabled")
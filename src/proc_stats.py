@@ -0,0 +1,98 @@
+"""
+Process memory helpers for the Amul scraper application.
+
+Reads /proc directly so no extra dependency is needed; on platforms without
+/proc the helpers return None and callers skip memory-based decisions.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Return the resident set size of a process in megabytes.
+
+    Args:
+        pid: Process ID to inspect
+
+    Returns:
+        RSS in MB, or None if it cannot be read
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _children_by_parent() -> Dict[int, List[int]]:
+    """Map every running process ID to its direct children."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces, so split after its closing paren
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+
+def descendant_pids(pid: int) -> List[int]:
+    """Return the IDs of every descendant of a process, children first.
+
+    Args:
+        pid: Root process ID
+
+    Returns:
+        Descendant process IDs, or an empty list if /proc is unavailable
+    """
+    if not os.path.isdir("/proc"):
+        return []
+    try:
+        children = _children_by_parent()
+    except OSError:
+        return []
+
+    descendants: List[int] = []
+    pending = list(children.get(pid, []))
+    while pending:
+        current = pending.pop(0)
+        descendants.append(current)
+        pending.extend(children.get(current, []))
+    return descendants
+
+
+def process_tree_rss_mb(pid: Optional[int] = None, include_root: bool = True) -> Optional[float]:
+    """Return the combined RSS of a process and all of its descendants.
+
+    Args:
+        pid: Root process ID (defaults to the current process)
+        include_root: Whether to count the root process itself
+
+    Returns:
+        Total RSS in MB, or None if /proc is unavailable
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    pid = os.getpid() if pid is None else pid
+
+    try:
+        children = _children_by_parent()
+    except OSError:
+        return None
+
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        if current != pid or include_root:
+            total += rss_mb(current) or 0.0
+        pending.extend(children.get(current, []))
+    return total
@@ -0,0 +1,214 @@
+"""
+Compact product records and an incremental parser for products API bodies.
+
+The poll loop only tracks a handful of fields per product, so responses are
+decoded one product at a time into slotted Product records instead of
+keeping every product's full nested dictionary (images, variants,
+metafields) alive for the whole cycle.
+"""
+
+import codecs
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# API field name -> Product attribute
+TRACKED_FIELDS = {
+    "_id": "id",
+    "name": "name",
+    "alias": "alias",
+    "available": "available",
+    "inventory_quantity": "inventory_quantity",
+}
+
+
+class Product:
+    """The tracked fields of one product.
+
+    Supports read-only ``item["name"]`` and ``item.get("available")`` access
+    under the API's field names, so it can be passed anywhere a product
+    dictionary was used before.
+    """
+
+    __slots__ = ("id", "name", "alias", "available", "inventory_quantity")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        alias: Optional[str] = None,
+        available: Any = False,
+        inventory_quantity: Any = 0,
+    ):
+        self.id = id
+        self.name = name
+        self.alias = alias
+        self.available = available
+        self.inventory_quantity = inventory_quantity
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Product":
+        """Build a Product from an API product dictionary, ignoring other fields."""
+        return cls(
+            data["_id"],
+            data.get("name"),
+            data.get("alias"),
+            data.get("available", False),
+            data.get("inventory_quantity", 0),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, TRACKED_FIELDS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a field by its API name, or default if it is not tracked."""
+        attribute = TRACKED_FIELDS.get(key)
+        return default if attribute is None else getattr(self, attribute)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the tracked fields under their API names."""
+        return {key: getattr(self, attribute) for key, attribute in TRACKED_FIELDS.items()}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Product(id={self.id!r}, name={self.name!r}, available={self.available!r})"
+
+
+_WHITESPACE = " \t\n\r"
+# Returned by ProductStreamParser._decode when the value is not complete yet
+_INCOMPLETE = object()
+
+
+class ProductStreamParser:
+    """Incrementally parses a products response into Product records.
+
+    Feed it the body in chunks. The ``data`` array is decoded one element at
+    a time and each element is reduced to a Product straight away; every
+    other top-level key (``paging``, ``total``, ...) is kept as is.
+    Elements without an ``_id`` are dropped.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"  # start, key, colon, value, array, done
+        self._key: Optional[str] = None
+        self.payload: Dict[str, Any] = {}
+
+    def feed(self, chunk: bytes) -> None:
+        """Parse as much of the body as the bytes received so far allow."""
+        # Drop what has already been parsed before appending the new text
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self) -> Dict[str, Any]:
+        """Finish parsing.
+
+        Returns:
+            The decoded body, with ``data`` as a list of Products
+
+        Raises:
+            ValueError: If the body is not a complete JSON object
+        """
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b"", final=True)
+        self._pos = 0
+        self._parse(final=True)
+        if self._state != "done":
+            raise ValueError("Incomplete products response")
+        return self.payload
+
+    def _decode(self, final: bool) -> Any:
+        """Decode the JSON value at the current position, or _INCOMPLETE if more data is needed.
+
+        A value is only accepted once the character after it has arrived, so a
+        number split across chunks is never read short.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("Malformed products response") from None
+            return _INCOMPLETE
+        if not final and end >= len(self._buffer):
+            return _INCOMPLETE
+        self._pos = end
+        return value
+
+    def _parse(self, final: bool) -> None:
+        buffer = self._buffer
+        while True:
+            while self._pos < len(buffer) and buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos >= len(buffer):
+                return
+            char = buffer[self._pos]
+
+            if self._state == "start":
+                if char != "{":
+                    raise ValueError("Products response is not a JSON object")
+                self._pos += 1
+                self._state = "key"
+            elif self._state == "key":
+                if char in ",}":
+                    self._pos += 1
+                    if char == "}":
+                        self._state = "done"
+                    continue
+                key = self._decode(final)
+                if key is _INCOMPLETE:
+                    return
+                self._key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    raise ValueError("Malformed products response")
+                self._pos += 1
+                self._state = "value"
+            elif self._state == "value":
+                if self._key == "data" and char == "[":
+                    self._pos += 1
+                    self.payload["data"] = []
+                    self._state = "array"
+                    continue
+                value = self._decode(final)
+                if value is _INCOMPLETE:
+                    return
+                self.payload[self._key] = value
+                self._state = "key"
+            elif self._state == "array":
+                if char in ",]":
+                    self._pos += 1
+                    if char == "]":
+                        self._state = "key"
+                    continue
+                item = self._decode(final)
+                if item is _INCOMPLETE:
+                    return
+                if isinstance(item, dict) and "_id" in item:
+                    self.payload["data"].append(Product.from_dict(item))
+            else:  # done
+                raise ValueError("Unexpected data after products response")
+
+
+def parse_products(chunks: Iterable[bytes]) -> Dict[str, Any]:
+    """Parse a products response body delivered as byte chunks.
+
+    Returns:
+        The decoded body, with ``data`` as a list of Products
+
+    Raises:
+        ValueError: If the body is not a complete JSON object
+    """
+    parser = ProductStreamParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,127 @@
+"""
+Query builder for the Amul products API.
+
+Field profiles name the set of product fields a request asks for. The poll
+loop only needs stock state, so the default ``stock`` profile keeps payloads
+small; ``full`` requests the complete catalog record the website itself uses.
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import config
+
+FIELD_PROFILES: Dict[str, List[str]] = {
+    # Everything update_db_and_notify reads; _id is always returned
+    "stock": ["name", "alias", "available", "inventory_quantity"],
+    "full": [
+        "name",
+        "brand",
+        "categories",
+        "collections",
+        "alias",
+        "sku",
+        "price",
+        "compare_price",
+        "original_price",
+        "images",
+        "metafields",
+        "discounts",
+        "catalog_only",
+        "is_catalog",
+        "seller",
+        "available",
+        "inventory_quantity",
+        "net_quantity",
+        "num_reviews",
+        "avg_rating",
+        "inventory_low_stock_quantity",
+        "inventory_allow_out_of_stock",
+        "default_variant",
+        "variants",
+        "lp_seller_ids",
+    ],
+}
+
+# Profiles that also request facet counts for the category page
+_FACET_PROFILES = {"full"}
+
+# Query key naming the field a filter applies to, e.g. filters[0][field]
+_FILTER_FIELD = re.compile(r"filters\[(\d+)\]\[field\]")
+
+
+def build_products_url(
+    category: str,
+    start: int = 0,
+    limit: Optional[int] = None,
+    profile: Optional[str] = None,
+) -> str:
+    """Build a products API URL for one category page.
+
+    Args:
+        category: Category to filter products by
+        start: Offset of the first product on the page
+        limit: Page size (defaults to config.API_PAGE_SIZE)
+        profile: Name of the field profile (defaults to config.API_FIELD_PROFILE)
+
+    Returns:
+        Fully encoded products API URL
+
+    Raises:
+        ValueError: If the profile name is unknown
+    """
+    profile = profile or config.API_FIELD_PROFILE
+    if profile not in FIELD_PROFILES:
+        raise ValueError(
+            f"Unknown field profile '{profile}', expected one of {sorted(FIELD_PROFILES)}"
+        )
+    limit = config.API_PAGE_SIZE if limit is None else limit
+
+    params = [(f"fields[{field}]", "1") for field in FIELD_PROFILES[profile]]
+    params += [
+        ("filters[0][field]", "categories"),
+        ("filters[0][value][0]", category),
+        ("filters[0][operator]", "in"),
+        ("filters[0][original]", "1"),
+    ]
+    if profile in _FACET_PROFILES:
+        params += [("facets", "true"), ("facetgroup", "default_category_facet")]
+    params += [("limit", str(limit)), ("total", "1"), ("start", str(start))]
+
+    return f"{config.API_BASE_URL}?{urlencode(params, safe='[]')}"
+
+
+def is_products_url(url: str) -> bool:
+    """Return True if a URL is a products API request, whatever its query."""
+    expected = urlsplit(config.API_BASE_URL)
+    actual = urlsplit(url)
+    return actual.netloc == expected.netloc and actual.path == expected.path
+
+
+def is_category_page_url(url: str, category: str, start: int = 0) -> bool:
+    """Return True if a URL requests one page of a category's products.
+
+    Other products API calls a page makes, such as recommendations or other
+    widgets, filter on something else and do not match.
+
+    Args:
+        url: Request URL to check
+        category: Category the products must be filtered by
+        start: Offset of the page; a URL without one starts at 0
+    """
+    if not is_products_url(url):
+        return False
+    query = parse_qs(urlsplit(url).query)
+    if query.get("start", ["0"])[0] != str(start):
+        return False
+    for key, values in query.items():
+        match = _FILTER_FIELD.fullmatch(key)
+        if not match or values[0] != "categories":
+            continue
+        prefix = f"filters[{match.group(1)}][value]["
+        if any(
+            category in value for name, value in query.items() if name.startswith(prefix)
+        ):
+            return True
+    return False
@@ -0,0 +1,126 @@
+"""
+Replay a capture file through the database and notification path.
+
+Feeds records written with CAPTURE_FILE back into update_db_and_notify,
+either as fast as possible or scaled to the original timing, without any
+network access. Useful for load-testing SQLite and notifications against
+real stock timelines, reproducing incidents, and comparing diff changes on
+identical input.
+
+Usage:
+    python replay.py data/capture.jsonl.gz --db data/replay.db
+    python replay.py data/capture.jsonl.gz --speed 60 --pincode 110001
+"""
+
+import argparse
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import notification
+from capture import read_captures
+from db import close_db, init_db, update_db_and_notify
+from logger import default_logger as logger
+from product import Product
+
+
+def replay(
+    path: str,
+    speed: float = 0,
+    pincodes: Optional[List[str]] = None,
+    skip_unchanged: bool = False,
+) -> Dict[str, Any]:
+    """Feed capture records to update_db_and_notify in order.
+
+    Args:
+        path: Capture file to read
+        speed: Multiple of the recorded pace; 0 replays as fast as possible
+        pincodes: Only replay these pincodes (all when empty)
+        skip_unchanged: Skip records of unchanged responses instead of
+            re-feeding the previous items for that pincode and categories
+
+    Returns:
+        Dictionary with record, item, change and restock counts and timings
+    """
+    last_items: Dict[Tuple[str, Tuple[str, ...]], List[Product]] = {}
+    stats = {"records": 0, "skipped": 0, "items": 0, "changed": 0, "restocked": 0}
+    first_ts: Optional[float] = None
+    started = time.monotonic()
+
+    for record in read_captures(path):
+        pincode = record["pincode"]
+        if pincodes and pincode not in pincodes:
+            continue
+
+        if speed > 0:
+            first_ts = record["ts"] if first_ts is None else first_ts
+            due = started + (record["ts"] - first_ts) / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        key = (pincode, tuple(record.get("categories") or ()))
+        items = record.get("items")
+        if items is None:
+            items = None if skip_unchanged else last_items.get(key)
+        else:
+            items = [Product.from_dict(item) for item in items]
+            last_items[key] = items
+        if not items:
+            stats["skipped"] += 1
+            continue
+
+        changed, restocked = update_db_and_notify(items, pincode)
+        stats["records"] += 1
+        stats["items"] += len(items)
+        stats["changed"] += changed
+        stats["restocked"] += restocked
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["records_per_second"] = round(stats["records"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured Amul API responses")
+    parser.add_argument("capture", help="Capture file written with CAPTURE_FILE")
+    parser.add_argument(
+        "--db", default="data/replay.db", help="Database to replay into (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=0, help="Multiple of recorded pace; 0 = no delays"
+    )
+    parser.add_argument(
+        "--pincode", action="append", dest="pincodes", help="Only replay this pincode"
+    )
+    parser.add_argument(
+        "--skip-unchanged", action="store_true", help="Do not re-feed unchanged responses"
+    )
+    parser.add_argument(
+        "--notify", action="store_true", help="Send restock email (off by default)"
+    )
+    args = parser.parse_args()
+
+    config.DB_PATH = args.db
+    # Queued replay email must not mix with the live monitor's outbox
+    notification.notification_queue.outbox = notification.Outbox(f"{args.db}.outbox")
+    if not args.notify:
+        notification.EMAIL_ENABLED = False
+
+    init_db()
+    try:
+        stats = replay(args.capture, args.speed, args.pincodes, args.skip_unchanged)
+    finally:
+        notification.notification_queue.stop()
+        close_db()
+    logger.info(
+        f"Replayed {stats['records']} records ({stats['items']} items, "
+        f"{stats['changed']} changes, {stats['restocked']} restocks, "
+        f"{stats['skipped']} skipped) in {stats['elapsed_seconds']}s "
+        f"({stats['records_per_second']} records/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
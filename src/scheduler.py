@@ -0,0 +1,171 @@
+"""
+Adaptive polling schedule for (pincode, category) targets.
+
+Each target keeps its own poll interval. Polls that see changes shorten the
+interval and quiet polls stretch it, bounded by POLL_MIN/MAX_INTERVAL_SECONDS.
+Targets that recently restocked stay at or below POLL_HOT_MAX_INTERVAL_SECONDS,
+upstream errors back off exponentially, and every delay is jittered so
+targets drift apart instead of polling in lockstep.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+Target = Tuple[str, str]  # (pincode, category)
+
+
+class TargetSchedule:
+    """Polling state for one (pincode, category) target."""
+
+    def __init__(self, pincode: str, category: str, interval: float, next_run: float):
+        self.pincode = pincode
+        self.category = category
+        self.interval = interval
+        self.next_run = next_run
+        self.change_rate = 0.0  # EWMA of polls that saw any change
+        self.restock_rate = 0.0  # EWMA of polls that saw a restock
+        self.consecutive_errors = 0
+        self.polls = 0
+        self.last_success: Optional[float] = None
+        self.last_duration = 0.0
+        self.last_item_count = 0
+
+    @property
+    def key(self) -> Target:
+        """The (pincode, category) pair identifying this target."""
+        return (self.pincode, self.category)
+
+    @property
+    def is_hot(self) -> bool:
+        """True while the target has been restocking recently."""
+        return self.restock_rate >= config.POLL_HOT_THRESHOLD
+
+
+class AdaptiveScheduler:
+    """Chooses when each target is polled next from its observed volatility.
+
+    Args:
+        targets: (pincode, category) pairs to schedule
+        base_interval: Starting interval for every target
+        min_interval: Shortest interval a volatile target can reach
+        max_interval: Longest interval a quiet or failing target can reach
+    """
+
+    def __init__(
+        self,
+        targets: List[Target],
+        base_interval: float = config.CHECK_INTERVAL_SECONDS,
+        min_interval: float = config.POLL_MIN_INTERVAL_SECONDS,
+        max_interval: float = config.POLL_MAX_INTERVAL_SECONDS,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self._lock = threading.Lock()
+
+        # Stagger first polls so a restart does not fire every target at once
+        now = time.monotonic()
+        spread = min(config.POLL_STARTUP_SPREAD_SECONDS, base_interval)
+        self.schedules: Dict[Target, TargetSchedule] = {
+            (pincode, category): TargetSchedule(
+                pincode, category, base_interval, now + random.uniform(0, spread)
+            )
+            for pincode, category in targets
+        }
+
+    def _jitter(self, delay: float) -> float:
+        """Spread a delay by +/- POLL_JITTER_FRACTION."""
+        fraction = config.POLL_JITTER_FRACTION
+        return delay * random.uniform(1 - fraction, 1 + fraction)
+
+    def record_success(self, target: Target, changed: int, restocked: int) -> float:
+        """Update a target after a successful poll and schedule its next one.
+
+        Args:
+            target: The (pincode, category) that was polled
+            changed: Number of items whose state changed
+            restocked: Number of items that came back in stock
+
+        Returns:
+            The new interval in seconds
+        """
+        alpha = config.POLL_RATE_SMOOTHING
+        with self._lock:
+            schedule = self.schedules[target]
+            schedule.polls += 1
+            schedule.consecutive_errors = 0
+            schedule.last_success = time.time()
+            schedule.change_rate += alpha * ((1.0 if changed else 0.0) - schedule.change_rate)
+            schedule.restock_rate += alpha * (
+                (1.0 if restocked else 0.0) - schedule.restock_rate
+            )
+
+            if changed:
+                interval = schedule.interval * config.POLL_SPEEDUP_FACTOR
+            else:
+                interval = schedule.interval * config.POLL_SLOWDOWN_FACTOR
+            upper = self.max_interval
+            if schedule.is_hot:
+                upper = min(upper, config.POLL_HOT_MAX_INTERVAL_SECONDS)
+            schedule.interval = max(self.min_interval, min(upper, interval))
+            schedule.next_run = time.monotonic() + self._jitter(schedule.interval)
+            return schedule.interval
+
+    def record_error(self, target: Target) -> float:
+        """Back off a target exponentially after a failed poll.
+
+        The backoff starts from the target's current interval, so a hot target
+        polled every minute retries after about a minute rather than after
+        the base interval.
+
+        Returns:
+            The delay in seconds until the next attempt
+        """
+        with self._lock:
+            schedule = self.schedules[target]
+            schedule.polls += 1
+            schedule.consecutive_errors += 1
+            start = max(self.min_interval, schedule.interval)
+            backoff = start * (2 ** (schedule.consecutive_errors - 1))
+            delay = min(self.max_interval, backoff)
+            schedule.next_run = time.monotonic() + self._jitter(delay)
+            return delay
+
+    def defer(self, target: Target, delay: float) -> None:
+        """Push a target's next run back, e.g. while another instance holds it."""
+        with self._lock:
+            self.schedules[target].next_run = time.monotonic() + self._jitter(
+                max(1.0, delay)
+            )
+
+    def adopt_interval(self, target: Target, interval: float) -> None:
+        """Continue from an interval another instance reached for this target."""
+        with self._lock:
+            self.schedules[target].interval = max(
+                self.min_interval, min(self.max_interval, interval)
+            )
+
+    def due(self, now: Optional[float] = None, exclude=()) -> List[TargetSchedule]:
+        """Return targets whose next run has arrived, most overdue first."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            ready = [
+                s for s in self.schedules.values()
+                if s.next_run <= now and s.key not in exclude
+            ]
+        return sorted(ready, key=lambda s: s.next_run)
+
+    def seconds_until_next(self, now: Optional[float] = None, exclude=()) -> float:
+        """Return how long until the next target is due."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pending = [
+                s.next_run for s in self.schedules.values() if s.key not in exclude
+            ]
+        if not pending:
+            return self.base_interval
+        return max(0.0, min(pending) - now)
@@ -0,0 +1,279 @@
+"""
+Supervised worker processes for the scrape fallback.
+
+Playwright and Chromium run in child processes instead of the monitor
+process, so a browser crash, hang or slow memory leak cannot take down or
+bloat the poll loop. Each pool slot is a supervisor thread that owns one
+worker process and talks to it over a pipe:
+
+- a job still running after the hard timeout gets the worker and its
+  browsers killed;
+- a worker is replaced after a fixed number of jobs, or once its process
+  tree (including Chromium) grows past the RSS cap;
+- a worker that dies is restarted on the next job.
+
+Inside the worker a single-slot BrowserPool keeps the browser warm between
+jobs. Jobs are module-level functions called as ``fn(context, *args)``, and
+their return values come back pickled, so they must only hold plain data.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Optional
+
+import config
+from logger import default_logger as logger
+from metrics import scrape_worker_restarts
+from proc_stats import descendant_pids, process_tree_rss_mb
+
+# Spawn gives every worker a clean interpreter; forking a process that runs
+# threads (and would later start Playwright) is not safe
+_mp = multiprocessing.get_context("spawn")
+
+_SHUTDOWN = object()
+
+
+def _serve(conn) -> None:
+    """Worker process entry point: run scrape jobs received over the pipe."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from browser_pool import BrowserPool
+
+    browsers = BrowserPool(size=1)
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                return  # Supervisor went away
+            if job is None:
+                return
+            fn, args = job
+            try:
+                conn.send((True, browsers.run(fn, *args)))
+            except Exception as e:
+                # Playwright errors do not always pickle; send a description
+                conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        browsers.shutdown()
+
+
+def _kill_tree(pid: int) -> None:
+    """SIGKILL a process and every descendant, such as its Chromium processes."""
+    for target in [pid] + descendant_pids(pid):
+        try:
+            os.kill(target, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class ScrapeWorker(threading.Thread):
+    """Pool slot that supervises one scrape worker process."""
+
+    def __init__(self, pool: "ScrapeWorkerPool", index: int):
+        super().__init__(name=f"scrape-worker-{index}", daemon=True)
+        self.pool = pool
+        self.process = None
+        self._conn = None
+        self.jobs = 0
+
+    def _ensure_process(self) -> None:
+        """Start a worker process if there is none or the last one died."""
+        if self.process is not None and self.process.is_alive():
+            return
+        if self.process is not None:
+            self._replace_crashed()
+
+        parent_conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_serve, args=(child_conn,), name=self.name, daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self.jobs = 0
+        logger.info(f"{self.name}: started worker process {self.process.pid}")
+
+    def _stop_process(self, graceful: bool) -> None:
+        """Stop the worker process, killing it if it does not exit in time."""
+        process, conn = self.process, self._conn
+        self.process, self._conn = None, None
+        if process is None:
+            return
+
+        if graceful and process.is_alive():
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+            process.join(timeout=self.pool.stop_seconds)
+        if process.is_alive():
+            _kill_tree(process.pid)
+        process.join(timeout=5)
+        if conn is not None:
+            conn.close()
+
+    def _replace_crashed(self) -> None:
+        """Clean up after a worker process that died; the next job starts a new one."""
+        process = self.process
+        self._stop_process(graceful=False)
+        logger.warning(f"{self.name}: worker process exited with code {process.exitcode}")
+        scrape_worker_restarts.inc(reason="crashed")
+
+    def _run_job(self, fn: Callable[..., Any], args: tuple) -> Any:
+        """Send one job to the worker process and wait for its result."""
+        self._ensure_process()
+        self.jobs += 1
+        try:
+            self._conn.send((fn, args))
+            finished = self._conn.poll(self.pool.timeout)
+        except OSError:
+            self._replace_crashed()
+            raise RuntimeError("Scrape worker process is not accepting jobs") from None
+
+        if not finished:
+            logger.error(
+                f"{self.name}: job exceeded {self.pool.timeout}s, killing worker process"
+            )
+            scrape_worker_restarts.inc(reason="timeout")
+            self._stop_process(graceful=False)
+            raise TimeoutError(f"Scrape did not finish within {self.pool.timeout}s")
+
+        try:
+            ok, value = self._conn.recv()
+        except (EOFError, OSError):
+            self._replace_crashed()
+            raise RuntimeError("Scrape worker process died during the job") from None
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def _recycle_if_needed(self) -> None:
+        """Replace the worker process after heavy use or memory growth."""
+        if self.process is None or not self.process.is_alive():
+            return
+
+        if self.jobs >= self.pool.max_jobs:
+            logger.info(f"{self.name}: recycling worker process after {self.jobs} jobs")
+            scrape_worker_restarts.inc(reason="max_jobs")
+            self._stop_process(graceful=True)
+            return
+
+        if self.pool.max_rss_mb:
+            rss = process_tree_rss_mb(self.process.pid)
+            if rss is not None and rss > self.pool.max_rss_mb:
+                logger.info(
+                    f"{self.name}: recycling worker process, RSS {rss:.0f}MB "
+                    f"over {self.pool.max_rss_mb}MB cap"
+                )
+                scrape_worker_restarts.inc(reason="memory")
+                self._stop_process(graceful=True)
+
+    def run(self) -> None:
+        """Serve scrape jobs from the pool queue until shutdown."""
+        while True:
+            job = self.pool._jobs.get()
+            if job is _SHUTDOWN:
+                self._stop_process(graceful=True)
+                return
+
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(self._run_job(fn, args))
+            except Exception as e:
+                future.set_exception(e)
+
+            try:
+                self._recycle_if_needed()
+            except Exception as e:
+                logger.error(f"{self.name}: failed to recycle worker process: {e}")
+
+
+class ScrapeWorkerPool:
+    """Bounded pool of supervised scrape worker processes.
+
+    Offers the same ``submit``/``run``/``shutdown`` interface as BrowserPool.
+
+    Args:
+        size: Number of worker processes
+        max_jobs: Jobs served by a worker process before it is replaced
+        max_rss_mb: Process tree RSS above which a worker is replaced (0 disables)
+        timeout: Seconds a job may run before its worker is killed
+        stop_seconds: Grace period for a worker to shut down cleanly
+    """
+
+    def __init__(
+        self,
+        size: int = config.BROWSER_POOL_SIZE,
+        max_jobs: int = config.SCRAPE_WORKER_MAX_JOBS,
+        max_rss_mb: int = config.SCRAPE_WORKER_MAX_RSS_MB,
+        timeout: float = config.SCRAPE_TIMEOUT_SECONDS,
+        stop_seconds: float = config.SCRAPE_WORKER_STOP_SECONDS,
+    ):
+        self.size = max(1, size)
+        self.max_jobs = max(1, max_jobs)
+        self.max_rss_mb = max_rss_mb
+        self.timeout = timeout
+        self.stop_seconds = stop_seconds
+        self._jobs: "queue.Queue[Any]" = queue.Queue()
+        self._workers: List[ScrapeWorker] = []
+        self._lock = threading.Lock()
+
+    def _start_workers(self) -> None:
+        """Start the supervisor threads on first use; processes start with the first job."""
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self.size):
+                worker = ScrapeWorker(self, index)
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"Started scrape worker pool with {self.size} processes")
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue ``fn(context, *args)`` to run in the next free worker process.
+
+        Args:
+            fn: Module-level function, so it can be sent to the worker by name
+            *args: Picklable arguments for fn
+
+        Returns:
+            Future resolving to the function's return value
+        """
+        self._start_workers()
+        future: Future = Future()
+        self._jobs.put((future, fn, args))
+        return future
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run ``fn(context, *args)`` in a worker process and wait for the result.
+
+        If the wait times out before a worker has picked the job up, the job
+        is dropped instead of running later for nobody.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        """Stop every worker process in the pool."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(_SHUTDOWN)
+        for worker in workers:
+            worker.join(timeout=self.stop_seconds + 10)
+
+
+# Global instance
+scrape_workers = ScrapeWorkerPool()
@@ -1,158 +1,252 @@
-from playwright.sync_api import sync_playwright
-from typing import List, Dict, Any
+from typing import Any, Dict, List, Optional
+from capture import record_capture
+from fingerprint import FetchResult, fingerprints
 import config
 import random
 import time
 from logger import default_logger as logger
-from session_storage import session_storage
-from api_client import api_client
+from metrics import stage_seconds
+from product import Product
+from concurrent.futures import Future
+from session_storage import get_session_storage
+from session_pool import get_session_pool
+from fetch_strategy import SCRAPE, fetch_strategy
+from products_query import is_category_page_url
+
+# Where fallback and harvest scrapes run: supervised worker processes, or
+# browser threads inside this process; only the one in use is imported
+if config.SCRAPE_WORKER_PROCESSES:
+    from scrape_workers import scrape_workers as scrape_pool
+else:
+    from browser_pool import browser_pool as scrape_pool
+
+
+def _store_session(pincode: str, result: Dict[str, Any]) -> None:
+    """Save the session a scrape captured and add it to the rotating pool.
+
+    Runs in the monitor process, whichever process the browser ran in.
+    """
+    headers, cookies = result.get("headers"), result.get("cookies")
+    session_storage = get_session_storage(pincode)
+    try:
+        if headers:
+            session_storage.save_headers(headers)
+            logger.info("Session header data saved successfully for future API calls")
+        if cookies is not None:
+            session_storage.save_cookies(cookies)
+            logger.info("Session cookies saved successfully for future API calls")
+        # Make the captured session available to the rotating pool
+        if headers and cookies:
+            get_session_pool(pincode).add(headers, cookies)
+    except Exception as e:
+        logger.error(f"Failed to save session data for pincode {pincode}: {e}")
+
+
+def scrape_amul_data(
+    pincode: str, category: Optional[str] = None
+) -> List[Product]:
+    """Scrape Amul product data and return the response data.
+
+    The scrape runs on a warm browser from the shared pool, which also caps
+    how many scrapes run at once across all pincodes. With
+    SCRAPE_WORKER_PROCESSES the browsers live in supervised worker
+    processes and the products and session come back over IPC.
+    """
+
+    try:
+        with stage_seconds.time(stage="scrape"):
+            result = scrape_pool.run(
+                _scrape_in_context,
+                pincode,
+                category,
+                timeout=config.SCRAPE_TIMEOUT_SECONDS,
+            )
+    except Exception as e:
+        logger.error(f"Scrape failed for pincode {pincode}: {e}")
+        return []
 
+    _store_session(pincode, result)
+    data = result["items"]
+    if data:
+        # The API fingerprints predate what this scrape is about to write, so
+        # process the next API response in full instead of matching it to them
+        fingerprints.forget(pincode)
+        record_capture("scrape", pincode, [category or config.CATEGORIES[0]], data)
+    return data
+
+
+def _human_pause(low: float, high: float) -> None:
+    """Sleep for a random human-like interval when jitter is enabled."""
+    if config.SCRAPE_HUMAN_JITTER:
+        time.sleep(random.uniform(low, high))
+
+
+def _block_non_essential(route) -> None:
+    """Abort requests the products API does not depend on (fast mode)."""
+    request = route.request
+    if request.resource_type in config.SCRAPE_BLOCKED_RESOURCE_TYPES or any(
+        host in request.url for host in config.SCRAPE_BLOCKED_HOSTS
+    ):
+        route.abort()
+    else:
+        route.continue_()
+
+
+def _scrape_in_context(
+    context, pincode: str, category: Optional[str] = None
+) -> Dict[str, Any]:
+    """Run a single scrape on a pooled browser context.
 
-def scrape_amul_data(pincode: str) -> List[Dict[str, Any]]:
-    """Scrape Amul product data and return the response data."""
+    In fast mode images, fonts, media and analytics are blocked and the scrape
+    returns as soon as the products API response and cookies are captured,
+    instead of waiting out fixed delays. Nothing is saved here, because this
+    may run in a worker process; see _store_session.
+
+    Returns:
+        Dictionary with the scraped "items" and the captured session
+        "headers" and "cookies" (None when not captured)
+    """
 
+    category = category or config.CATEGORIES[0]
     logger.info(f"Starting scrape for pincode: {pincode}")
     response_data = None
+    captured_headers = None
+    cookies = None
+    fast_mode = config.SCRAPE_FAST_MODE
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--disable-infobars",
-                "--no-sandbox",
-                "--disable-dev-shm-usage",
-            ],
-        )
+    page = context.new_page()
+    try:
+        if fast_mode:
+            page.route("**/*", _block_non_essential)
 
-        context = browser.new_context(
-            user_agent=random.choice(
-                [
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                    "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-                ]
-            ),
-            locale="en-US",
-            timezone_id="Asia/Kolkata",
-            viewport={"width": 1366, "height": 768},
-            extra_http_headers={"Accept-Language": "en-US,en;q=0.9"},
-        )
-        page = context.new_page()
+        def is_first_page(response) -> bool:
+            return is_category_page_url(response.url, category)
 
         def handle_response(response):
-            nonlocal response_data
-            if config.API_URL in response.url:
-                try:
-                    response_data = response.json().get("data", [])
-                    logger.info(
-                        f"Captured API response with {len(response_data)} items"
-                    )
-                    # Save session data (headers) for future API calls
-                    if len(response_data) > 0:
-                        try:
-                            # Get headers from the last successful request
-                            headers = response.headers
-
-                            # Save headers data
-                            session_storage.save_headers(headers)
-                            logger.info(
-                                "Session header data saved successfully for future API calls"
-                            )
-
-                        except Exception as e:
-                            logger.error(
-                                f"Failed to save session header data: {e}")
-
-                except Exception as e:
-                    logger.error(f"Error parsing API response: {e}")
+            nonlocal response_data, captured_headers
+            # Only the browsed category's first page counts, and only the
+            # first one that came back with products
+            if response_data or not is_first_page(response):
+                return
+            try:
+                response_data = [
+                    Product.from_dict(item)
+                    for item in response.json().get("data", [])
+                    if "_id" in item
+                ]
+                logger.info(
+                    f"Captured API response with {len(response_data)} items"
+                )
+                # Keep the headers of a successful request for future API calls
+                if len(response_data) > 0:
+                    captured_headers = dict(response.headers)
+
+            except Exception as e:
+                logger.error(f"Error parsing API response: {e}")
 
         page.on("response", handle_response)
 
         # Go to products page
         page.goto(
-            "https://shop.amul.com/en/browse/protein", wait_until="domcontentloaded"
+            f"https://shop.amul.com/en/browse/{category}",
+            wait_until="domcontentloaded",
         )
 
         # Fill pincode and submit
         page.get_by_placeholder("Enter Your Pincode").fill(pincode)
-        time.sleep(random.uniform(1.5, 3.0))
+        _human_pause(1.5, 3.0)
         page.get_by_role("button", name=pincode).click()
 
-        # Explicitly wait for API response
-        try:
-            page.wait_for_response(
-                lambda r: config.API_URL in r.url, timeout=15000)
-        except Exception:
-            logger.warning("Did not receive API response in time")
+        # Explicitly wait for API response, unless it already arrived
+        if response_data is None:
+            try:
+                page.wait_for_response(is_first_page, timeout=15000)
+            except Exception:
+                logger.warning("Did not receive API response in time")
 
         try:
             # Get cookies from the browser context
             cookies = context.cookies()
-            # Save cookies
-            session_storage.save_cookies(cookies)
-            logger.info(
-                "Session cookies saved successfully for future API calls")
-
         except Exception as e:
-            logger.error(f"Failed to save cookies session data: {e}")
+            logger.error(f"Failed to read session cookies: {e}")
 
-        # Add short delay for late responses
-        time.sleep(random.uniform(2, 4))
+        # Fast mode is done once the response and cookies are in hand;
+        # otherwise leave a short delay for late responses
+        if not fast_mode:
+            time.sleep(random.uniform(2, 4))
 
         logger.info(f"Page loaded: {page.title()}")
+    finally:
         page.close()
-        context.close()
-        browser.close()
 
     if response_data:
         logger.info(f"Scraping completed successfully for {pincode}")
     else:
         logger.warning(f"No data captured for {pincode}")
 
-    return response_data
+    return {"items": response_data or [], "headers": captured_headers, "cookies": cookies}
+
 
+def start_session_harvest(pincode: str) -> Optional[Future]:
+    """Queue a background scrape whose only purpose is a fresh session.
 
-def get_amul_data(pincode: str) -> List[Dict[str, Any]]:
-    """Enhanced function that tries API call first, falls back to full scraping.
+    Harvests share the scrape slots with inline fallbacks but may only hold
+    SESSION_HARVEST_MAX_IN_FLIGHT of them. They are also skipped while the
+    pincode's scrape circuit is open, and their outcome feeds that circuit.
 
     Args:
-        pincode: The pincode to filter products for
+        pincode: The pincode to harvest a session for
 
     Returns:
-        List of product dictionaries
+        Future that resolves once the scrape has finished, or None if the
+        harvest was skipped
     """
-    logger.info(f"Getting Amul data for pincode: {pincode}")
-
-    # First, try to use saved session data for direct API call
-    if session_storage.has_session_data():
-        logger.info("Attempting direct API call with saved session data")
-
-        # Validate session before using it
-        if api_client.validate_session():
-            # Try direct API call
-            api_data = api_client.fetch_products(pincode)
-            if api_data:
-                return api_data
-            else:
-                logger.warning("Direct API call failed, clearing session data")
-                session_storage.clear_session_data()
+    if not fetch_strategy.acquire_scrape_slot(background=True):
+        return None
+    breaker = fetch_strategy.breaker(SCRAPE, pincode)
+    if not breaker.allow():
+        fetch_strategy.release_scrape_slot(background=True)
+        logger.info(
+            f"Skipping session harvest for pincode {pincode}: "
+            f"scrape circuit open for {breaker.retry_in():.0f}s"
+        )
+        return None
+
+    def store(done: Future) -> None:
+        fetch_strategy.release_scrape_slot(background=True)
+        if done.cancelled():
+            return
+        result = done.result() if done.exception() is None else None
+        if result and result.get("headers") and result.get("cookies"):
+            breaker.record_success()
+            _store_session(pincode, result)
         else:
-            logger.warning("Session validation failed, clearing session data")
-            session_storage.clear_session_data()
-    else:
-        logger.info("No saved session data available")
+            breaker.record_failure()
 
-    # If API call failed or no session data, fall back to full scraping
-    logger.info("Falling back to full website scraping")
-    scraped_data = scrape_amul_data(pincode)
+    future = scrape_pool.submit(_scrape_in_context, pincode)
+    future.add_done_callback(store)
+    return future
 
-    if scraped_data:
-        logger.info(
-            f"Full scraping successful - retrieved {len(scraped_data)} products"
-        )
-        return scraped_data
-    else:
-        logger.error("Both API call and full scraping failed")
-        return []
+
+def get_amul_data(
+    pincode: str, categories: Optional[List[str]] = None
+) -> FetchResult:
+    """Fetch products from the cheapest tier that can currently serve them.
+
+    API calls rotate across the pincode's session pool and are retried with
+    backoff before a check escalates to a full scrape, and both tiers sit
+    behind per-pincode circuit breakers; see fetch_strategy. The inline scrape
+    is only needed while the pool is cold; afterwards the session harvester
+    keeps it stocked in the background.
+
+    Args:
+        pincode: The pincode to filter products for
+        categories: Categories to fetch (defaults to config.CATEGORIES)
+
+    Returns:
+        List of Products, UNCHANGED if the API response matched
+        the previous one, or None if no tier could serve the check
+    """
+    categories = categories or config.CATEGORIES
+    logger.info(f"Getting Amul data for pincode: {pincode}")
+    return fetch_strategy.fetch(pincode, categories, scrape_amul_data)
@@ -0,0 +1,236 @@
+"""
+Rotating per-pincode session pools and the background session harvester.
+
+Each pincode keeps several harvested sessions (headers plus cookies). API
+requests rotate across the usable ones, and a background thread harvests
+replacements before cookies expire, so the polling hot path does not have to
+wait on a browser scrape once the pool is warm.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from logger import default_logger as logger
+from session_storage import SessionHealth, get_session_storage
+
+
+class PooledSession:
+    """One harvested session: request headers, cookies and their health."""
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        headers: Dict[str, str],
+        cookies: List[Dict[str, Any]],
+        harvested_at: Optional[float] = None,
+    ):
+        self.id = next(self._ids)
+        self.headers = dict(headers)
+        self.cookies = cookies
+        self.harvested_at = time.time() if harvested_at is None else harvested_at
+        self.uses = 0
+        self.health = SessionHealth()
+        self.health.update_cookie_expiry(cookies)
+        # Converted once here instead of on every request
+        self.cookie_dict = {
+            cookie["name"]: cookie["value"]
+            for cookie in cookies
+            if "name" in cookie and "value" in cookie
+        }
+
+    def is_usable(self, now: Optional[float] = None) -> bool:
+        """Return True if the session is unexpired and has not failed too often."""
+        return (
+            not self.health.is_expired(now)
+            and self.health.failure_count < config.SESSION_MAX_FAILURES
+        )
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        """Return True if the session should be replaced soon."""
+        now = time.time() if now is None else now
+        if now - self.harvested_at > config.SESSION_MAX_AGE_SECONDS:
+            return True
+        expiry = self.health.cookie_expiry
+        return expiry is not None and expiry - config.SESSION_REFRESH_AHEAD_SECONDS <= now
+
+
+class SessionPool:
+    """Rotating pool of harvested sessions for one pincode.
+
+    Args:
+        pincode: The pincode the sessions were harvested for
+        size: Number of sessions the harvester keeps in the pool
+    """
+
+    def __init__(self, pincode: str, size: int = config.SESSION_POOL_SIZE):
+        self.pincode = pincode
+        self.size = max(1, size)
+        self._sessions: List[PooledSession] = []
+        self._next = 0
+        self._seeded = False
+        self._lock = threading.Lock()
+
+    def _seed_from_storage(self) -> None:
+        """Load the last persisted session on first use, e.g. after a restart."""
+        self._seeded = True
+        storage = get_session_storage(self.pincode)
+        if not storage.has_session_data():
+            return
+        headers = storage.load_headers()
+        cookies = storage.load_cookies()
+        if headers and cookies:
+            self._sessions.append(PooledSession(headers, cookies))
+
+    def add(self, headers: Dict[str, str], cookies: List[Dict[str, Any]]) -> PooledSession:
+        """Add a freshly harvested session, evicting the oldest if the pool is full."""
+        session = PooledSession(headers, cookies)
+        with self._lock:
+            self._seeded = True
+            self._sessions.append(session)
+            self._sessions.sort(key=lambda s: s.harvested_at)
+            while len(self._sessions) > self.size:
+                evicted = self._sessions.pop(0)
+                logger.info(
+                    f"Evicted session {evicted.id} for pincode {self.pincode} "
+                    f"after {evicted.uses} uses"
+                )
+        logger.info(f"Added session {session.id} to pool for pincode {self.pincode}")
+        return session
+
+    def acquire(self) -> Optional[PooledSession]:
+        """Return the next usable session in round-robin order, or None."""
+        now = time.time()
+        with self._lock:
+            if not self._seeded:
+                self._seed_from_storage()
+            usable = [s for s in self._sessions if s.is_usable(now)]
+            if not usable:
+                return None
+            session = usable[self._next % len(usable)]
+            self._next += 1
+            session.uses += 1
+            return session
+
+    def discard(self, session: PooledSession) -> None:
+        """Remove a session that stopped working.
+
+        When the last session goes, the persisted copy is cleared too so it is
+        not reloaded after a restart.
+        """
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            empty = not self._sessions
+        logger.warning(f"Discarded session {session.id} for pincode {self.pincode}")
+        if empty:
+            get_session_storage(self.pincode).clear_session_data()
+
+    def usable_count(self, now: Optional[float] = None) -> int:
+        """Return how many sessions can currently serve requests."""
+        with self._lock:
+            if not self._seeded:
+                self._seed_from_storage()
+            return sum(1 for s in self._sessions if s.is_usable(now))
+
+    def needs_harvest(self, now: Optional[float] = None) -> bool:
+        """Return True if the pool is short of fresh, usable sessions."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._seeded:
+                self._seed_from_storage()
+            fresh = [
+                s for s in self._sessions if s.is_usable(now) and not s.needs_refresh(now)
+            ]
+        return len(fresh) < self.size
+
+
+# Per-pincode instances
+_pools: Dict[str, SessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(pincode: str) -> SessionPool:
+    """Return the session pool for a pincode, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(pincode)
+        if pool is None:
+            pool = SessionPool(pincode)
+            _pools[pincode] = pool
+        return pool
+
+
+class SessionHarvester(threading.Thread):
+    """Background thread that keeps every pincode's session pool topped up.
+
+    Pools with the fewest usable sessions are topped up first. The first
+    pass waits ``startup_delay``, since the monitor's first checks scrape
+    cold pools inline anyway. After that the harvester checks again every
+    interval, and early whenever one of its harvests finishes.
+
+    Args:
+        pincodes: Pincodes whose pools should be maintained
+        harvest: Callable that starts a harvest for a pincode and returns a
+            Future, or None if no harvest can start right now (for example
+            because every scrape slot it may use is busy)
+        interval: Seconds between pool checks
+        startup_delay: Seconds before the first pool check
+    """
+
+    def __init__(
+        self,
+        pincodes: List[str],
+        harvest: Callable[[str], Optional[Future]],
+        interval: float = config.SESSION_HARVEST_INTERVAL_SECONDS,
+        startup_delay: float = config.SESSION_HARVEST_STARTUP_DELAY_SECONDS,
+    ):
+        super().__init__(name="session-harvester", daemon=True)
+        self.pincodes = list(pincodes)
+        self.harvest = harvest
+        self.interval = interval
+        self.startup_delay = startup_delay
+        self._in_flight: Dict[str, Future] = {}
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+
+    def _check_pools(self) -> None:
+        """Start a harvest for every pincode whose pool needs one, emptiest first."""
+        now = time.time()
+        waiting = []
+        for pincode in self.pincodes:
+            pending = self._in_flight.get(pincode)
+            if pending is not None and not pending.done():
+                continue
+            pool = get_session_pool(pincode)
+            if pool.needs_harvest(now):
+                waiting.append((pool.usable_count(now), pincode))
+
+        for _, pincode in sorted(waiting):
+            future = self.harvest(pincode)
+            if future is None:
+                continue
+            logger.info(f"Harvesting a fresh session for pincode: {pincode}")
+            self._in_flight[pincode] = future
+            future.add_done_callback(lambda _: self._wake.set())
+
+    def run(self) -> None:
+        """Check pools every interval, or when a harvest finishes, until stopped."""
+        if self._stop_event.wait(self.startup_delay):
+            return
+        while not self._stop_event.is_set():
+            self._wake.clear()
+            try:
+                self._check_pools()
+            except Exception as e:
+                logger.error(f"Session harvester error: {e}")
+            self._wake.wait(self.interval)
+
+    def stop(self) -> None:
+        """Stop the harvester thread."""
+        self._stop_event.set()
+        self._wake.set()
+        self.join(timeout=5)
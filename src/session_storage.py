@@ -1,24 +1,126 @@
 import json
 import os
-from typing import Dict, List, Optional, Any
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Any, Tuple
+import config
 from logger import default_logger as logger
 
 
+class SessionHealth:
+    """Tracks how recently a saved session worked and when its cookies expire."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.failure_count = 0
+        self.cookie_expiry: Optional[float] = None
+
+    def update_cookie_expiry(self, cookies: List[Dict[str, Any]]) -> None:
+        """Record the earliest expiry among persistent Playwright cookies.
+
+        Session cookies (``expires`` of -1 or missing) do not limit the expiry.
+        """
+        expiries = [
+            cookie["expires"]
+            for cookie in cookies
+            if isinstance(cookie.get("expires"), (int, float)) and cookie["expires"] > 0
+        ]
+        with self._lock:
+            self.cookie_expiry = min(expiries) if expiries else None
+
+    def record_success(self) -> None:
+        """Mark the session as just having served a valid API response."""
+        with self._lock:
+            self.last_success = time.time()
+            self.failure_count = 0
+
+    def record_failure(self) -> None:
+        """Mark the session as just having failed an API request."""
+        with self._lock:
+            self.last_failure = time.time()
+            self.failure_count += 1
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        """Return True if the saved cookies are past (or about to pass) their expiry."""
+        now = time.time() if now is None else now
+        return (
+            self.cookie_expiry is not None
+            and self.cookie_expiry - config.SESSION_EXPIRY_MARGIN_SECONDS <= now
+        )
+
+
 class SessionStorage:
-    """Manages storage and retrieval of cookies and headers for API requests."""
+    """Manages storage and retrieval of cookies and headers for API requests.
+
+    Parsed files are cached in memory and only re-read when their mtime or
+    size changes, so repeated loads cost a single ``stat``. Writes go to a
+    temporary file that is atomically renamed into place, so other processes
+    sharing the directory never observe a half-written file.
+    """
 
     def __init__(self, storage_dir: str = "data"):
         self.storage_dir = storage_dir
         self.cookies_file = os.path.join(storage_dir, "cookies.json")
         self.headers_file = os.path.join(storage_dir, "headers.json")
+        self._cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
         self._ensure_storage_dir()
 
     def _ensure_storage_dir(self) -> None:
         """Create storage directory if it doesn't exist."""
         if not os.path.exists(self.storage_dir):
-            os.makedirs(self.storage_dir)
+            os.makedirs(self.storage_dir, exist_ok=True)
             logger.info(f"Created storage directory: {self.storage_dir}")
 
+    def _write_json(self, path: str, data: Any) -> None:
+        """Atomically replace a file with compact JSON and refresh the cache."""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.storage_dir, prefix=".tmp-", suffix=".json"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        stat = os.stat(path)
+        with self._lock:
+            self._cache[path] = ((stat.st_mtime_ns, stat.st_size), data)
+
+    def _read_json(self, path: str) -> Tuple[Any, bool]:
+        """Return a file's parsed JSON, re-parsing only if the file changed.
+
+        Returns:
+            Tuple of (data, parsed) where parsed is True on a cache miss;
+            data is None if the file does not exist
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._cache.pop(path, None)
+            return None, False
+
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1], False
+
+        with open(path, "r") as f:
+            data = json.load(f)
+        with self._lock:
+            self._cache[path] = (version, data)
+        return data, True
+
     def save_cookies(self, cookies: List[Dict[str, Any]]) -> bool:
         """Save cookies to storage file.
 
@@ -29,8 +131,7 @@ class SessionStorage:
             bool: True if saved successfully, False otherwise
         """
         try:
-            with open(self.cookies_file, "w") as f:
-                json.dump(cookies, f, indent=2)
+            self._write_json(self.cookies_file, cookies)
             logger.info(f"Saved {len(cookies)} cookies to {self.cookies_file}")
             return True
         except Exception as e:
@@ -40,17 +141,15 @@ class SessionStorage:
     def load_cookies(self) -> Optional[List[Dict[str, Any]]]:
         """Load cookies from storage file.
 
+        The returned list is shared with the cache and must not be mutated.
+
         Returns:
             List of cookie dictionaries or None if not found/invalid
         """
         try:
-            if not os.path.exists(self.cookies_file):
-                return None
-
-            with open(self.cookies_file, "r") as f:
-                cookies = json.load(f)
-
-            logger.info(f"Loaded {len(cookies)} cookies from {self.cookies_file}")
+            cookies, parsed = self._read_json(self.cookies_file)
+            if parsed:
+                logger.info(f"Loaded {len(cookies)} cookies from {self.cookies_file}")
             return cookies
         except Exception as e:
             logger.error(f"Failed to load cookies: {e}")
@@ -66,8 +165,7 @@ class SessionStorage:
             bool: True if saved successfully, False otherwise
         """
         try:
-            with open(self.headers_file, "w") as f:
-                json.dump(headers, f, indent=2)
+            self._write_json(self.headers_file, dict(headers))
             logger.info(f"Saved {len(headers)} headers to {self.headers_file}")
             return True
         except Exception as e:
@@ -77,17 +175,15 @@ class SessionStorage:
     def load_headers(self) -> Optional[Dict[str, str]]:
         """Load headers from storage file.
 
+        The returned dict is shared with the cache and must not be mutated.
+
         Returns:
             Dictionary of headers or None if not found/invalid
         """
         try:
-            if not os.path.exists(self.headers_file):
-                return None
-
-            with open(self.headers_file, "r") as f:
-                headers = json.load(f)
-
-            logger.info(f"Loaded {len(headers)} headers from {self.headers_file}")
+            headers, parsed = self._read_json(self.headers_file)
+            if parsed:
+                logger.info(f"Loaded {len(headers)} headers from {self.headers_file}")
             return headers
         except Exception as e:
             logger.error(f"Failed to load headers: {e}")
@@ -104,17 +200,43 @@ class SessionStorage:
     def clear_session_data(self) -> None:
         """Clear all saved session data."""
         try:
-            if os.path.exists(self.cookies_file):
-                os.remove(self.cookies_file)
-                logger.info("Cleared cookies file")
-
-            if os.path.exists(self.headers_file):
-                os.remove(self.headers_file)
-                logger.info("Cleared headers file")
+            for path, label in (
+                (self.cookies_file, "cookies"),
+                (self.headers_file, "headers"),
+            ):
+                try:
+                    os.remove(path)
+                    logger.info(f"Cleared {label} file")
+                except FileNotFoundError:
+                    pass
+
+            with self._lock:
+                self._cache.clear()
 
         except Exception as e:
             logger.error(f"Failed to clear session data: {e}")
 
 
-# Global instance
-session_storage = SessionStorage()
+# Per-pincode instances
+_storages: Dict[str, SessionStorage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_session_storage(pincode: str) -> SessionStorage:
+    """Return the session storage for a pincode.
+
+    The Amul site binds the selected pincode to the browser session, so each
+    monitored pincode keeps its own cookies and headers.
+
+    Args:
+        pincode: The pincode the session was harvested for
+
+    Returns:
+        SessionStorage instance rooted at SESSION_DIR/<pincode>
+    """
+    with _storages_lock:
+        storage = _storages.get(pincode)
+        if storage is None:
+            storage = SessionStorage(os.path.join(config.SESSION_DIR, pincode))
+            _storages[pincode] = storage
+        return storage
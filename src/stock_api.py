@@ -0,0 +1,331 @@
+"""
+Read-only HTTP API for current stock, served from an in-memory snapshot.
+
+Every committed stock write publishes a new immutable StockSnapshot, built by
+copying only the pincodes the write touched. Requests read whichever
+snapshot is current, so they never open the database or wait on the writer.
+
+    GET /stock?pincode=110001&product=whey&available=true
+
+``pincode`` and ``available`` filter exactly; ``product`` matches a product
+ID or, case-insensitively, part of the product name. Responses carry an ETag
+that only changes when the requested pincode (or, unfiltered, any pincode)
+changes, and ``If-None-Match`` gets a 304 without a body.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import config
+from logger import default_logger as logger
+
+# (name, quantity, available) per product ID
+PincodeStock = Dict[str, Tuple[str, int, int]]
+
+# Encoded responses kept per snapshot before the cache is reset
+MAX_CACHED_RESPONSES = 256
+
+
+class StockSnapshot:
+    """Immutable view of current stock at one point in time.
+
+    Args:
+        pincodes: Stock per pincode; never modified after construction
+        versions: Snapshot version at which each pincode last changed
+        version: Version of this snapshot
+        updated: Time at which each pincode last changed
+    """
+
+    def __init__(
+        self,
+        pincodes: Dict[str, PincodeStock],
+        versions: Dict[str, int],
+        version: int,
+        updated: Dict[str, float],
+    ):
+        self.pincodes = pincodes
+        self.versions = versions
+        self.version = version
+        self.updated = updated
+        self.published_at = time.time()
+        self._responses: Dict[Tuple, Tuple[str, bytes]] = {}
+
+    def items(
+        self,
+        pincode: Optional[str] = None,
+        product: Optional[str] = None,
+        available: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the stock rows matching every given filter."""
+        if pincode is not None:
+            selected: Iterable[Tuple[str, PincodeStock]] = [
+                (pincode, self.pincodes.get(pincode, {}))
+            ]
+        else:
+            selected = sorted(self.pincodes.items())
+        needle = product.lower() if product else None
+
+        rows = []
+        for code, stock in selected:
+            for item_id, (name, quantity, is_available) in stock.items():
+                if available is not None and bool(is_available) != available:
+                    continue
+                if needle and item_id != product and needle not in (name or "").lower():
+                    continue
+                rows.append(
+                    {
+                        "pincode": code,
+                        "product_id": item_id,
+                        "name": name,
+                        "quantity": quantity,
+                        "available": bool(is_available),
+                    }
+                )
+        return rows
+
+    def response(
+        self,
+        etag_prefix: str,
+        pincode: Optional[str] = None,
+        product: Optional[str] = None,
+        available: Optional[bool] = None,
+    ) -> Tuple[str, bytes]:
+        """Return the ETag and encoded JSON body for a query, caching the body.
+
+        A pincode's body only carries that pincode's version and update time,
+        so its bytes change exactly when its ETag does.
+
+        Args:
+            etag_prefix: Distinguishes this process's versions from a previous run's
+        """
+        key = (pincode, product, available)
+        cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+
+        if pincode is not None:
+            version = self.versions.get(pincode, 0)
+            published_at = self.updated.get(pincode)
+        else:
+            version, published_at = self.version, self.published_at
+        items = self.items(pincode, product, available)
+        body = json.dumps(
+            {
+                "version": version,
+                "published_at": round(published_at, 3) if published_at else None,
+                "count": len(items),
+                "items": items,
+            },
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8")
+        result = (f'"{etag_prefix}-{version}"', body)
+        if len(self._responses) >= MAX_CACHED_RESPONSES:
+            self._responses.clear()
+        self._responses[key] = result
+        return result
+
+
+class SnapshotStore:
+    """Holds the current StockSnapshot and publishes new ones on writes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = StockSnapshot({}, {}, 0, {})
+        self.loaded = False
+        # Versions restart with the process, so ETags carry a per-process tag
+        self.etag_prefix = uuid.uuid4().hex[:8]
+
+    def current(self) -> StockSnapshot:
+        """Return the latest snapshot; safe to call from any thread without locking."""
+        return self._current
+
+    def load(self, rows: Iterable[Tuple[str, str, str, int, int]]) -> None:
+        """Publish a full snapshot from (pincode, product ID, name, quantity, available) rows."""
+        pincodes: Dict[str, PincodeStock] = {}
+        for pincode, item_id, name, quantity, available in rows:
+            pincodes.setdefault(pincode, {})[item_id] = (name, quantity, available)
+        now = time.time()
+        with self._lock:
+            version = self._current.version + 1
+            self._current = StockSnapshot(
+                pincodes,
+                {pincode: version for pincode in pincodes},
+                version,
+                {pincode: now for pincode in pincodes},
+            )
+            self.loaded = True
+        logger.info(f"Published stock snapshot with {len(pincodes)} pincodes")
+
+    def apply(self, changes: List[Tuple]) -> None:
+        """Publish a snapshot with committed changes applied.
+
+        Only the pincodes in ``changes`` are copied; the rest are shared with
+        the previous snapshot.
+
+        Args:
+            changes: (pincode, item_id, name, quantity, available, ...) tuples
+        """
+        if not self.loaded or not changes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._current
+            version = previous.version + 1
+            pincodes = dict(previous.pincodes)
+            versions = dict(previous.versions)
+            updated = dict(previous.updated)
+            copied = set()
+            for pincode, item_id, name, quantity, available, *_ in changes:
+                if pincode not in copied:
+                    pincodes[pincode] = dict(pincodes.get(pincode, {}))
+                    versions[pincode] = version
+                    updated[pincode] = now
+                    copied.add(pincode)
+                pincodes[pincode][item_id] = (name, quantity, available)
+            self._current = StockSnapshot(pincodes, versions, version, updated)
+
+    def replace_pincode(
+        self, pincode: str, rows: Iterable[Tuple[str, str, int, int]]
+    ) -> None:
+        """Publish a snapshot with one pincode's stock replaced by what is on disk.
+
+        Used when another monitor instance has been writing the pincode.
+
+        Args:
+            pincode: The pincode to replace
+            rows: (product ID, name, quantity, available) rows for the pincode
+        """
+        if not self.loaded:
+            return
+        stock: PincodeStock = {
+            item_id: (name, quantity, available)
+            for item_id, name, quantity, available in rows
+        }
+        now = time.time()
+        with self._lock:
+            previous = self._current
+            version = previous.version + 1
+            pincodes = dict(previous.pincodes)
+            versions = dict(previous.versions)
+            updated = dict(previous.updated)
+            pincodes[pincode] = stock
+            versions[pincode] = version
+            updated[pincode] = now
+            self._current = StockSnapshot(pincodes, versions, version, updated)
+
+
+def _parse_bool(value: str) -> bool:
+    """Parse an ``available`` query value."""
+    lowered = value.lower()
+    if lowered in ("1", "true", "yes"):
+        return True
+    if lowered in ("0", "false", "no"):
+        return False
+    raise ValueError(f"available must be true or false, not {value!r}")
+
+
+class _StockHandler(BaseHTTPRequestHandler):
+    """Serves the current snapshot on /stock."""
+
+    store: SnapshotStore
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/stock":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            available = query.get("available", [None])[0]
+            filters = {
+                "pincode": query.get("pincode", [None])[0],
+                "product": query.get("product", [None])[0],
+                "available": _parse_bool(available) if available is not None else None,
+            }
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        store = self.store
+        etag, body = store.current().response(store.etag_prefix, **filters)
+        if etag in _parse_etags(self.headers.get("If-None-Match", "")):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        """Keep API reads out of the application log."""
+
+
+def _parse_etags(header: str) -> List[str]:
+    """Return the entity tags listed in an If-None-Match header, weak or strong."""
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+class StockAPIServer:
+    """Background HTTP server for the stock read API.
+
+    Args:
+        store: Snapshots to serve
+        host: Interface to bind (defaults to config.STOCK_API_HOST)
+        port: Port to bind (defaults to config.STOCK_API_PORT; 0 picks a free one)
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        host: str = config.STOCK_API_HOST,
+        port: int = config.STOCK_API_PORT,
+    ):
+        self.store = store
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Bind the port and serve on a daemon thread."""
+        handler = type("StockHandler", (_StockHandler,), {"store": self.store})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stock-api", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Serving current stock on http://{self.host}:{self.port}/stock")
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Global instance
+stock_snapshot = SnapshotStore()
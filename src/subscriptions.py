@@ -0,0 +1,189 @@
+"""
+Subscriber routing for restock notifications.
+
+Subscriptions are stored in the SQLite database and mirrored into an inverted
+index from (pincode, product_id) to subscriber emails, plus a per-pincode
+index for subscribers who want every product at a pincode. Routing a cycle's
+restocks is one pass over the restocks, so its cost follows the number of
+matches rather than subscribers times products.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+from logger import default_logger as logger
+
+# Product ID that subscribes to every product at a pincode
+ANY_PRODUCT = "*"
+
+
+def _normalize_email(email: str) -> str:
+    """Return the form an address is stored and compared in."""
+    return email.strip().lower()
+
+
+class SubscriptionStore:
+    """Persistent subscriptions with an in-memory inverted index.
+
+    Args:
+        db_path: Database holding the subscriptions table; defaults to
+            config.DB_PATH as it is when the store first connects
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._by_target: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._by_pincode: Dict[str, Set[str]] = defaultdict(set)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a short-lived connection; subscription writes are rare."""
+        conn = sqlite3.connect(self.db_path or config.DB_PATH, timeout=5)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                email TEXT NOT NULL,
+                pincode TEXT NOT NULL,
+                product_id TEXT NOT NULL, -- Amul _id, or '*' for every product
+                PRIMARY KEY (pincode, product_id, email)
+            ) WITHOUT ROWID
+        """)
+        return conn
+
+    def _index(self, email: str, pincode: str, product_id: str) -> None:
+        """Add one subscription to the in-memory index; caller holds the lock."""
+        if product_id == ANY_PRODUCT:
+            self._by_pincode[pincode].add(email)
+        else:
+            self._by_target[(pincode, product_id)].add(email)
+
+    def load(self) -> None:
+        """Build the index from the subscriptions table."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT email, pincode, product_id FROM subscriptions"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._by_target.clear()
+            self._by_pincode.clear()
+            for email, pincode, product_id in rows:
+                # Rows written before addresses were normalized may differ in case
+                self._index(_normalize_email(email), pincode, product_id)
+            self._loaded = True
+        logger.info(f"Loaded {len(rows)} subscriptions")
+
+    def _ensure_loaded(self) -> None:
+        """Load the index on first use."""
+        if not self._loaded:
+            self.load()
+
+    def add(self, email: str, pincode: str, product_id: str = ANY_PRODUCT) -> None:
+        """Subscribe an email to a product (or every product) at a pincode."""
+        self.add_many([(email, pincode, product_id)])
+
+    def add_many(self, subscriptions: Iterable[Tuple[str, str, str]]) -> int:
+        """Subscribe many (email, pincode, product_id) triples in one transaction.
+
+        Returns:
+            Number of subscriptions written
+        """
+        rows = [
+            (_normalize_email(email), str(pincode), str(product_id or ANY_PRODUCT))
+            for email, pincode, product_id in subscriptions
+        ]
+        self._ensure_loaded()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO subscriptions (email, pincode, product_id) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+        finally:
+            conn.close()
+
+        with self._lock:
+            for row in rows:
+                self._index(*row)
+        return len(rows)
+
+    def remove(self, email: str, pincode: str, product_id: str = ANY_PRODUCT) -> None:
+        """Remove a single subscription."""
+        email = _normalize_email(email)
+        self._ensure_loaded()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM subscriptions "
+                    "WHERE lower(trim(email)) = ? AND pincode = ? AND product_id = ?",
+                    (email, pincode, product_id),
+                )
+        finally:
+            conn.close()
+
+        with self._lock:
+            if product_id == ANY_PRODUCT:
+                self._by_pincode.get(pincode, set()).discard(email)
+            else:
+                self._by_target.get((pincode, product_id), set()).discard(email)
+
+    def import_file(self, path: str) -> int:
+        """Add subscriptions from a JSON file.
+
+        The file holds a list of objects with ``email``, ``pincode`` and an
+        optional ``product_id`` (every product when omitted).
+
+        Returns:
+            Number of subscriptions read from the file
+        """
+        with open(path, "r") as f:
+            entries = json.load(f)
+        count = self.add_many(
+            (entry["email"], entry["pincode"], entry.get("product_id", ANY_PRODUCT))
+            for entry in entries
+        )
+        logger.info(f"Imported {count} subscriptions from {path}")
+        return count
+
+    def route(
+        self,
+        restocks: List[Dict[str, Any]],
+        default_recipients: Iterable[str] = (),
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Group restocked items into one digest per recipient.
+
+        Args:
+            restocks: Items with 'pincode' and 'product_id' keys
+            default_recipients: Emails that receive every restock (e.g. EMAIL_TO)
+
+        Returns:
+            Dictionary mapping recipient email, lowercased, to the items they
+            should hear about
+        """
+        self._ensure_loaded()
+        defaults = {_normalize_email(email) for email in default_recipients if email.strip()}
+        digests: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+        with self._lock:
+            for item in restocks:
+                pincode = item.get("pincode")
+                recipients = set(defaults)
+                recipients.update(self._by_pincode.get(pincode, ()))
+                recipients.update(self._by_target.get((pincode, item.get("product_id")), ()))
+                for email in recipients:
+                    digests[email].append(item)
+        return dict(digests)
+
+
+# Global instance
+subscription_store = SubscriptionStore()
@@ -0,0 +1,460 @@
+"""
+Lease-based sharing of (pincode, category) targets between monitor instances.
+
+Several monitors can poll one target list together. Before a monitor fetches a
+target it takes a lease on it; the lease is extended by a heartbeat while the
+check runs and given back, with the next due time, once the target has been
+diffed. A target is therefore never polled by two instances at once, and the
+shared next-run time keeps the adaptive cadence when it moves between them.
+
+Targets stick to the instance that last polled them. An instance only takes
+over another one's target when that instance has stopped heartbeating, or when
+the target is overdue by more than a lease; and instances owning more than
+their fair share (targets / live instances) hand the excess back on release,
+so work spreads out as instances are added and is reassigned when one dies.
+
+Backends:
+- SQLiteLeaseBackend: tables in a SQLite file that every instance can open,
+  such as DB_PATH on a shared volume
+- MemoryLeaseBackend: in-process stand-in for a single instance or tests
+
+Other stores can be plugged in by implementing LeaseBackend.
+"""
+
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import config
+from logger import default_logger as logger
+from metrics import work_leases_held
+
+Target = Tuple[str, str]  # (pincode, category)
+
+# Row of a target nobody has polled yet
+_NEW_TARGET: Dict[str, Any] = {
+    "owner": None,
+    "last_owner": None,
+    "lease_expires": 0.0,
+    "next_run": 0.0,
+    "interval": None,
+}
+
+
+class LeaseBackend(ABC):
+    """Storage for target leases and instance heartbeats.
+
+    Each target row is a dictionary with ``owner`` (instance the target sticks
+    to, or None), ``last_owner`` (instance that last polled it),
+    ``lease_expires`` and ``next_run`` (epoch seconds) and ``interval``.
+    Every other method is only called inside ``transaction()``, which must be
+    exclusive across all instances sharing the backend.
+    """
+
+    @abstractmethod
+    def transaction(self):
+        """Return a context manager holding the backend exclusively."""
+
+    @abstractmethod
+    def get(self, key: Target) -> Optional[Dict[str, Any]]:
+        """Return a target's row, or None if it was never registered."""
+
+    @abstractmethod
+    def put(self, key: Target, row: Dict[str, Any]) -> None:
+        """Insert or replace a target's row."""
+
+    @abstractmethod
+    def held_by(self, node: str, now: float) -> List[Target]:
+        """Return the targets whose lease a node currently holds."""
+
+    @abstractmethod
+    def owned_count(self, node: str) -> int:
+        """Return how many targets stick to a node."""
+
+    @abstractmethod
+    def target_count(self) -> int:
+        """Return how many targets are registered."""
+
+    @abstractmethod
+    def touch_node(self, node: str, now: float) -> None:
+        """Record a heartbeat from a node."""
+
+    @abstractmethod
+    def remove_node(self, node: str) -> None:
+        """Forget a node's heartbeats, e.g. on clean shutdown."""
+
+    @abstractmethod
+    def live_nodes(self, since: float) -> Set[str]:
+        """Return the nodes that sent a heartbeat at or after ``since``."""
+
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+
+class MemoryLeaseBackend(LeaseBackend):
+    """Lease backend kept in this process, for a single instance or tests."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._targets: Dict[Target, Dict[str, Any]] = {}
+        self._nodes: Dict[str, float] = {}
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def get(self, key: Target) -> Optional[Dict[str, Any]]:
+        row = self._targets.get(key)
+        return dict(row) if row is not None else None
+
+    def put(self, key: Target, row: Dict[str, Any]) -> None:
+        self._targets[key] = dict(row)
+
+    def held_by(self, node: str, now: float) -> List[Target]:
+        return [
+            key
+            for key, row in self._targets.items()
+            if row["owner"] == node and row["lease_expires"] > now
+        ]
+
+    def owned_count(self, node: str) -> int:
+        return sum(1 for row in self._targets.values() if row["owner"] == node)
+
+    def target_count(self) -> int:
+        return len(self._targets)
+
+    def touch_node(self, node: str, now: float) -> None:
+        self._nodes[node] = now
+
+    def remove_node(self, node: str) -> None:
+        self._nodes.pop(node, None)
+
+    def live_nodes(self, since: float) -> Set[str]:
+        return {node for node, seen in self._nodes.items() if seen >= since}
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Lease backend stored in a SQLite file shared by every instance.
+
+    Uses its own connection, so lease traffic never waits on the stock
+    writer's connection. Transactions take SQLite's write lock up front
+    (BEGIN IMMEDIATE), which serialises claims across processes. Instances on
+    different hosts need a filesystem with working SQLite locking.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS work_targets (
+                pincode TEXT NOT NULL,
+                category TEXT NOT NULL,
+                owner TEXT,
+                last_owner TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                next_run REAL NOT NULL DEFAULT 0,
+                interval REAL,
+                PRIMARY KEY (pincode, category)
+            );
+            CREATE INDEX IF NOT EXISTS idx_work_targets_owner ON work_targets (owner);
+            CREATE TABLE IF NOT EXISTS work_nodes (
+                node TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            );
+        """)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, key: Target) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            """
+            SELECT owner, last_owner, lease_expires, next_run, interval
+            FROM work_targets WHERE pincode = ? AND category = ?
+            """,
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("owner", "last_owner", "lease_expires", "next_run", "interval"), row))
+
+    def put(self, key: Target, row: Dict[str, Any]) -> None:
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO work_targets
+                (pincode, category, owner, last_owner, lease_expires, next_run, interval)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                key[0],
+                key[1],
+                row["owner"],
+                row["last_owner"],
+                row["lease_expires"],
+                row["next_run"],
+                row["interval"],
+            ),
+        )
+
+    def held_by(self, node: str, now: float) -> List[Target]:
+        rows = self._conn.execute(
+            "SELECT pincode, category FROM work_targets WHERE owner = ? AND lease_expires > ?",
+            (node, now),
+        ).fetchall()
+        return [(pincode, category) for pincode, category in rows]
+
+    def owned_count(self, node: str) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM work_targets WHERE owner = ?", (node,)
+        ).fetchone()[0]
+
+    def target_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM work_targets").fetchone()[0]
+
+    def touch_node(self, node: str, now: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO work_nodes (node, heartbeat_at) VALUES (?, ?)",
+            (node, now),
+        )
+
+    def remove_node(self, node: str) -> None:
+        self._conn.execute("DELETE FROM work_nodes WHERE node = ?", (node,))
+
+    def live_nodes(self, since: float) -> Set[str]:
+        rows = self._conn.execute(
+            "SELECT node FROM work_nodes WHERE heartbeat_at >= ?", (since,)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WorkQueue:
+    """One instance's view of the shared target queue.
+
+    Args:
+        backend: Where leases are stored
+        node_id: Name of this instance (defaults to hostname-pid)
+        lease_seconds: How long a lease lasts without a heartbeat
+        heartbeat_seconds: How often held leases are extended
+    """
+
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        node_id: Optional[str] = None,
+        lease_seconds: float = config.WORK_LEASE_SECONDS,
+        heartbeat_seconds: float = config.WORK_HEARTBEAT_SECONDS,
+    ):
+        self.backend = backend
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = min(heartbeat_seconds, lease_seconds / 3)
+        self._held: Set[Target] = set()
+        self._held_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.handovers = 0
+
+    def _live_nodes(self, now: float) -> Set[str]:
+        """Instances that heartbeated within a lease; call inside a transaction."""
+        return self.backend.live_nodes(now - self.lease_seconds) | {self.node_id}
+
+    def _fair_share(self, live: Set[str]) -> int:
+        """Targets each live instance should own; call inside a transaction."""
+        return max(1, math.ceil(self.backend.target_count() / len(live)))
+
+    def register(self, keys: List[Target]) -> None:
+        """Add any of this instance's targets the backend does not know yet."""
+        with self.backend.transaction():
+            for key in keys:
+                if self.backend.get(key) is None:
+                    self.backend.put(key, dict(_NEW_TARGET))
+
+    def claim(
+        self, keys: List[Target], limit: int
+    ) -> Tuple[Dict[Target, Tuple[Optional[float], bool]], Dict[Target, float]]:
+        """Lease up to ``limit`` of the given due targets.
+
+        Args:
+            keys: Targets this instance considers due, most overdue first
+            limit: Most leases to take
+
+        Returns:
+            Tuple of (leased targets mapped to (shared interval or None, True if
+            another instance polled it last), targets that are not available
+            yet mapped to the seconds until they may be)
+        """
+        claimed: Dict[Target, Tuple[Optional[float], bool]] = {}
+        waits: Dict[Target, float] = {}
+        now = time.time()
+        with self.backend.transaction():
+            self.backend.touch_node(self.node_id, now)
+            live = self._live_nodes(now)
+            owned = self.backend.owned_count(self.node_id)
+            share = self._fair_share(live)
+
+            for key in keys:
+                if len(claimed) >= limit:
+                    break
+                row = self.backend.get(key) or dict(_NEW_TARGET)
+                owner = row["owner"]
+                if owner != self.node_id and row["lease_expires"] > now:
+                    waits[key] = row["lease_expires"] - now  # Being polled elsewhere
+                    continue
+                if row["next_run"] > now:
+                    waits[key] = row["next_run"] - now
+                    continue
+                if owner is None:
+                    if owned >= share:
+                        # Leave unowned targets to instances below their share
+                        waits[key] = self.lease_seconds
+                        continue
+                    owned += 1
+                elif owner != self.node_id:
+                    overdue = now - row["next_run"]
+                    if owner in live and overdue < self.lease_seconds:
+                        waits[key] = self.lease_seconds - overdue
+                        continue
+                    owned += 1
+
+                handed_over = row["last_owner"] not in (None, self.node_id)
+                row.update(
+                    owner=self.node_id,
+                    last_owner=self.node_id,
+                    lease_expires=now + self.lease_seconds,
+                )
+                self.backend.put(key, row)
+                claimed[key] = (row["interval"], handed_over)
+
+        with self._held_lock:
+            self._held.update(claimed)
+        handovers = sum(1 for _, handed_over in claimed.values() if handed_over)
+        if handovers:
+            self.handovers += handovers
+            logger.info(f"Took over {handovers} targets from other instances")
+        return claimed, waits
+
+    def release(self, key: Target, interval: float, delay: float) -> None:
+        """Give a lease back once its check is done; never raises.
+
+        Args:
+            key: The leased target
+            interval: The target's current polling interval, shared with other instances
+            delay: Seconds until the target is next due
+        """
+        with self._held_lock:
+            self._held.discard(key)
+        try:
+            now = time.time()
+            with self.backend.transaction():
+                row = self.backend.get(key)
+                if row is None or row["owner"] != self.node_id:
+                    return  # The lease expired and another instance took over
+                # Hand targets above this instance's fair share back to the pool
+                share = self._fair_share(self._live_nodes(now))
+                if self.backend.owned_count(self.node_id) > share:
+                    row["owner"] = None
+                row.update(lease_expires=0.0, next_run=now + delay, interval=interval)
+                self.backend.put(key, row)
+        except Exception as e:
+            logger.error(f"Failed to release lease on {key}: {e}")
+
+    def held_count(self) -> int:
+        """Return how many leases this instance holds."""
+        with self._held_lock:
+            return len(self._held)
+
+    def heartbeat(self) -> None:
+        """Mark this instance alive and extend every lease it holds."""
+        now = time.time()
+        with self._held_lock:
+            held = set(self._held)
+        with self.backend.transaction():
+            self.backend.touch_node(self.node_id, now)
+            for key in held:
+                row = self.backend.get(key)
+                if row is not None and row["owner"] == self.node_id:
+                    row["lease_expires"] = now + self.lease_seconds
+                    self.backend.put(key, row)
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Work queue heartbeat failed: {e}")
+
+    def start(self, keys: List[Target]) -> None:
+        """Register this instance's targets, announce it and start heartbeating."""
+        self.register(keys)
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, name="work-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Sharing targets as {self.node_id} "
+            f"(lease {self.lease_seconds:.0f}s, heartbeat {self.heartbeat_seconds:.0f}s)"
+        )
+
+    def stop(self) -> None:
+        """Stop heartbeating and give up any leases so others take over at once."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            now = time.time()
+            with self.backend.transaction():
+                for key in self.backend.held_by(self.node_id, now):
+                    row = self.backend.get(key)
+                    row["lease_expires"] = 0.0
+                    self.backend.put(key, row)
+                self.backend.remove_node(self.node_id)
+        except Exception as e:
+            logger.error(f"Failed to release leases on shutdown: {e}")
+        self.backend.close()
+
+
+def create_work_queue() -> Optional[WorkQueue]:
+    """Build the work queue selected by config.WORK_QUEUE_BACKEND.
+
+    Returns:
+        WorkQueue, or None when targets are not shared
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    name = config.WORK_QUEUE_BACKEND.lower()
+    if not name:
+        return None
+    if name == "sqlite":
+        backend: LeaseBackend = SQLiteLeaseBackend(config.WORK_QUEUE_DB_PATH)
+    elif name == "memory":
+        backend = MemoryLeaseBackend()
+    else:
+        raise ValueError(f"Unknown WORK_QUEUE_BACKEND: {config.WORK_QUEUE_BACKEND}")
+    work_queue = WorkQueue(backend, config.WORK_QUEUE_NODE_ID or None)
+    work_leases_held.set_function(work_queue.held_count)
+    return work_queue
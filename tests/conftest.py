@@ -0,0 +1,38 @@
+"""
+Shared test setup: import the application modules from src/ and point every
+data path at a scratch directory, so tests never touch data/ or /app/data.
+"""
+
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("METRICS_ENABLED", "False")
+os.environ.setdefault("STOCK_API_ENABLED", "False")
+os.environ.setdefault("SESSION_HARVESTER_ENABLED", "False")
+
+import config  # noqa: E402
+
+_DATA_DIR = tempfile.mkdtemp(prefix="amul-tests-")
+config.DB_PATH = os.path.join(_DATA_DIR, "data.db")
+config.SESSION_DIR = os.path.join(_DATA_DIR, "sessions")
+config.OUTBOX_DIR = os.path.join(_DATA_DIR, "outbox")
+config.CAPTURE_FILE = ""
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Give the test its own initialized database file."""
+    import db
+
+    db.close_db()
+    monkeypatch.setattr(config, "DB_PATH", str(tmp_path / "data.db"))
+    db.init_db()
+    yield db
+    db.close_db()
@@ -0,0 +1,41 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from api_client import AmulApiClient
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """Records each request's Cookie header and always sets a cookie back."""
+
+    seen = []
+
+    def do_GET(self):
+        self.seen.append(self.headers.get("Cookie"))
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Set-Cookie", "pincode=FROM_SERVER; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_server_cookies_are_not_sent_with_later_requests():
+    server = HTTPServer(("127.0.0.1", 0), CookieHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/api"
+    client = AmulApiClient()
+    try:
+        for pincode in ("110001", "560001"):
+            response = client._get(url, {}, {"pincode": pincode}, 5)
+            response.content
+            response.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        client._page_executor.shutdown()
+
+    assert CookieHandler.seen == ["pincode=110001", "pincode=560001"]
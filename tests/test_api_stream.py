@@ -0,0 +1,44 @@
+import json
+
+import api_client as api_client_module
+from api_client import api_client
+from product import ProductStreamParser
+from session_pool import get_session_pool
+
+
+def test_products_are_decoded_while_the_body_arrives(monkeypatch):
+    pincode = "920001"
+    get_session_pool(pincode).add(
+        {"user-agent": "tests"}, [{"name": "pincode", "value": pincode, "expires": -1}]
+    )
+    products = [
+        {"_id": f"p{i}", "name": f"Item {i}", "available": 1, "inventory_quantity": i}
+        for i in range(5)
+    ]
+    body = json.dumps({"data": products, "paging": {"total": 5}}).encode("utf-8")
+    fed = []
+
+    class CountingParser(ProductStreamParser):
+        def feed(self, chunk):
+            fed.append(chunk)
+            super().feed(chunk)
+
+    class Response:
+        status_code = 200
+
+        def iter_content(self, chunk_size):
+            for index, start in enumerate(range(0, len(body), 16)):
+                # Every earlier chunk must be parsed before the next is read
+                assert len(fed) == index
+                yield body[start:start + 16]
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(api_client_module, "ProductStreamParser", CountingParser)
+    monkeypatch.setattr(api_client, "_get", lambda *args: Response())
+
+    items = api_client.fetch_products(pincode, ["protein"])
+
+    assert [item.id for item in items] == [f"p{i}" for i in range(5)]
+    assert b"".join(fed) == body
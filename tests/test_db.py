@@ -0,0 +1,26 @@
+import pytest
+
+
+def test_rolled_back_write_does_not_leave_interned_ids(fresh_db):
+    # A quantity SQLite cannot bind fails the write after the IDs were interned
+    with pytest.raises(Exception):
+        fresh_db.write_changes([("110001", "p1", "Whey", [5], 1, True, False)])
+    fresh_db.invalidate_stock_cache()
+
+    fresh_db.write_changes([("560001", "p2", "Lassi", 3, 1, True, False)])
+    fresh_db.write_changes([("110001", "p1", "Whey", 5, 1, True, False)])
+
+    assert sorted(fresh_db.read_current_stock()) == [
+        ("110001", "p1", "Whey", 5, 1),
+        ("560001", "p2", "Lassi", 3, 1),
+    ]
+
+
+def test_rolled_back_write_without_invalidation(fresh_db):
+    with pytest.raises(Exception):
+        fresh_db.write_changes([("110001", "p1", "Whey", [5], 1, True, False)])
+
+    fresh_db.write_changes([("560001", "p2", "Lassi", 3, 1, True, False)])
+    fresh_db.write_changes([("110001", "p1", "Whey", 5, 1, True, False)])
+
+    assert len(fresh_db.read_current_stock()) == 2
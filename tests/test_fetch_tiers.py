@@ -0,0 +1,98 @@
+import json
+
+import scraper
+from api_client import api_client
+from fingerprint import UNCHANGED
+from product import Product
+from session_pool import get_session_pool
+
+
+class FakeResponse:
+    """Stands in for a streamed requests response."""
+
+    def __init__(self, payload):
+        self.status_code = 200
+        self._body = json.dumps(payload).encode("utf-8")
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _product(available):
+    return {
+        "_id": "p1",
+        "name": "Whey Protein",
+        "alias": "whey-protein",
+        "available": available,
+        "inventory_quantity": 5 if available else 0,
+    }
+
+
+def test_api_after_scrape_is_not_dropped_as_unchanged(monkeypatch):
+    pincode = "900001"
+    get_session_pool(pincode).add(
+        {"user-agent": "tests"}, [{"name": "pincode", "value": pincode, "expires": -1}]
+    )
+    payload = {"data": [_product(0)], "paging": {"total": 1}}
+    monkeypatch.setattr(api_client, "_get", lambda *args: FakeResponse(payload))
+    monkeypatch.setattr(
+        scraper.scrape_pool,
+        "run",
+        lambda fn, pincode, category, timeout=None: {
+            "items": [Product.from_dict(_product(1))],
+            "headers": None,
+            "cookies": None,
+        },
+    )
+
+    first = api_client.fetch_products(pincode, ["protein"])
+    assert [item.available for item in first] == [0]
+    assert api_client.fetch_products(pincode, ["protein"]) is UNCHANGED
+
+    scraped = scraper.scrape_amul_data(pincode, "protein")
+    assert [item.available for item in scraped] == [1]
+
+    # Same bytes as before the scrape, but the scrape wrote available=1
+    after = api_client.fetch_products(pincode, ["protein"])
+    assert after is not UNCHANGED
+    assert [item.available for item in after] == [0]
+
+
+def test_background_scrapes_leave_a_slot_for_inline_fallbacks():
+    from fetch_strategy import FetchStrategy
+
+    strategy = FetchStrategy(max_scrapes=2, max_background=1)
+    assert strategy.acquire_scrape_slot(background=True)
+    assert not strategy.acquire_scrape_slot(background=True)
+    assert strategy.acquire_scrape_slot()
+    assert not strategy.acquire_scrape_slot()
+
+    strategy.release_scrape_slot(background=True)
+    assert strategy.acquire_scrape_slot(background=True)
+
+
+def test_api_tier_gives_up_without_backoff_once_the_breaker_opens(monkeypatch):
+    import fetch_strategy
+    from fetch_strategy import API, FetchStrategy
+
+    pincode = "900002"
+    get_session_pool(pincode).add(
+        {"user-agent": "tests"}, [{"name": "pincode", "value": pincode, "expires": -1}]
+    )
+    strategy = FetchStrategy(api_attempts=3, api_backoff=10)
+    strategy.breaker(API, pincode).failure_threshold = 1
+    calls, sleeps = [], []
+    monkeypatch.setattr(
+        fetch_strategy.api_client,
+        "fetch_products",
+        lambda pincode, categories: calls.append(pincode),
+    )
+    monkeypatch.setattr(fetch_strategy.time, "sleep", sleeps.append)
+
+    assert strategy._fetch_api(pincode, ["protein"]) is None
+    assert len(calls) == 1
+    assert sleeps == []
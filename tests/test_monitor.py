@@ -0,0 +1,39 @@
+import monitor
+from fingerprint import fingerprints
+from product import Product
+
+PINCODE = "910001"
+
+
+def _monitor(monkeypatch, write):
+    item = Product("p1", "Whey Protein", "whey-protein", 1, 5)
+    monkeypatch.setattr(monitor, "get_amul_data", lambda pincode, categories: [item])
+    monkeypatch.setattr(monitor, "write_changes", write)
+    monkeypatch.setattr(monitor, "send_consolidated_notification", lambda restocks: None)
+    return monitor.PincodeMonitor([PINCODE], ["protein"], max_workers=1)
+
+
+def test_failed_write_is_recorded_as_an_error(fresh_db, monkeypatch):
+    def fail(changes):
+        raise RuntimeError("disk full")
+
+    forgotten = []
+    monkeypatch.setattr(fingerprints, "forget", forgotten.append)
+    pipeline = _monitor(monkeypatch, fail)
+    pipeline.run_once()
+    pipeline.stop()
+
+    schedule = pipeline.scheduler.schedules[(PINCODE, "protein")]
+    assert schedule.consecutive_errors == 1
+    assert schedule.change_rate == 0.0
+    assert PINCODE in forgotten
+
+
+def test_written_changes_are_recorded_after_the_write(fresh_db, monkeypatch):
+    pipeline = _monitor(monkeypatch, fresh_db.write_changes)
+    pipeline.run_once()
+    pipeline.stop()
+
+    schedule = pipeline.scheduler.schedules[(PINCODE, "protein")]
+    assert schedule.consecutive_errors == 0
+    assert schedule.change_rate > 0
@@ -0,0 +1,80 @@
+import time
+
+import config
+import main
+import notification
+
+
+def test_startup_delivers_pending_outbox_without_new_email(fresh_db, tmp_path, monkeypatch):
+    outbox = notification.Outbox(str(tmp_path / "outbox"))
+    now = time.time()
+    outbox.save(
+        {
+            "id": "0000000000001-pending",
+            "subject": "Whey Back in Stock",
+            "body": "Left over from a crash",
+            "to": ["alerts@example.com"],
+            "attempts": 0,
+            "next_attempt": now,
+            "created_at": now,
+        }
+    )
+    queue = notification.NotificationQueue(outbox)
+    sent = []
+    monkeypatch.setattr(queue._connection, "send", lambda msg: sent.append(msg["Subject"]))
+    monkeypatch.setattr(main, "notification_queue", queue)
+    # No targets, so the run itself queues nothing new
+    monkeypatch.setattr(config, "PINCODES", [])
+
+    main.run(once=True)
+
+    assert sent == ["Whey Back in Stock"]
+    assert outbox.pending() == []
+
+
+def _message(message_id, next_attempt, attempts=0):
+    return {
+        "id": message_id,
+        "subject": message_id,
+        "body": "Whey is back",
+        "to": ["alerts@example.com"],
+        "attempts": attempts,
+        "next_attempt": next_attempt,
+        "created_at": next_attempt,
+    }
+
+
+def test_stop_leaves_backing_off_messages_in_the_outbox(tmp_path, monkeypatch):
+    outbox = notification.Outbox(str(tmp_path / "outbox"))
+    now = time.time()
+    outbox.save(_message("0000000000001-due", now))
+    outbox.save(_message("0000000000002-backoff", now + 60, attempts=1))
+    queue = notification.NotificationQueue(outbox)
+    sent = []
+    monkeypatch.setattr(queue._connection, "send", lambda msg: sent.append(msg["Subject"]))
+
+    queue.start()
+    queue.stop()
+
+    assert sent == ["0000000000001-due"]
+    assert [m["id"] for m in outbox.pending()] == ["0000000000002-backoff"]
+    assert queue.depth() == 0
+
+
+def test_send_failing_during_stop_is_not_retried_at_once(tmp_path, monkeypatch):
+    outbox = notification.Outbox(str(tmp_path / "outbox"))
+    queue = notification.NotificationQueue(outbox)
+    attempts = []
+
+    def fail(msg):
+        attempts.append(msg["Subject"])
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(queue._connection, "send", fail)
+    queue.enqueue("Whey Back in Stock", "body", ["alerts@example.com"])
+    queue.stop()
+
+    assert attempts == ["Whey Back in Stock"]
+    [pending] = outbox.pending()
+    assert pending["attempts"] == 1
+    assert pending["next_attempt"] > time.time()
@@ -0,0 +1,92 @@
+import config
+import scraper
+from products_query import build_products_url, is_category_page_url
+
+
+def test_only_the_category_first_page_matches():
+    assert is_category_page_url(build_products_url("protein", 0), "protein")
+    assert not is_category_page_url(build_products_url("protein", 24), "protein")
+    assert not is_category_page_url(build_products_url("lassi", 0), "protein")
+    assert not is_category_page_url(
+        f"{config.API_BASE_URL}?filters[0][field]=alias&filters[0][value][0]=protein",
+        "protein",
+    )
+    assert not is_category_page_url("https://example.com/api?start=0", "protein")
+
+
+class FakeResponse:
+    def __init__(self, url, ids):
+        self.url = url
+        self.headers = {"x-request": url}
+        self._ids = ids
+
+    def json(self):
+        return {"data": [{"_id": i, "name": i, "available": 1} for i in self._ids]}
+
+
+class FakePage:
+    """Replays a fixed list of products API responses when the page loads."""
+
+    def __init__(self, responses):
+        self._responses = responses
+        self._handlers = []
+
+    def on(self, event, handler):
+        self._handlers.append(handler)
+
+    def route(self, pattern, handler):
+        pass
+
+    def goto(self, url, wait_until=None):
+        for response in self._responses:
+            for handler in self._handlers:
+                handler(response)
+
+    def get_by_placeholder(self, text):
+        return self
+
+    def get_by_role(self, role, name=None):
+        return self
+
+    def fill(self, value):
+        pass
+
+    def click(self):
+        pass
+
+    def wait_for_response(self, predicate, timeout=None):
+        raise AssertionError("response already captured")
+
+    def title(self):
+        return "Amul"
+
+    def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, page):
+        self._page = page
+
+    def new_page(self):
+        return self._page
+
+    def cookies(self):
+        return []
+
+
+def test_scrape_keeps_the_browsed_category_first_page(monkeypatch):
+    monkeypatch.setattr(config, "SCRAPE_FAST_MODE", True)
+    monkeypatch.setattr(scraper, "_human_pause", lambda low, high: None)
+    wanted = build_products_url("protein", 0)
+    page = FakePage([
+        FakeResponse(build_products_url("lassi", 0), ["other"]),
+        FakeResponse(wanted, ["p1", "p2"]),
+        FakeResponse(build_products_url("protein", 24), ["p3"]),
+        FakeResponse(wanted, ["late"]),
+    ])
+
+    result = scraper._scrape_in_context(FakeContext(page), "110001", "protein")
+
+    assert [item.id for item in result["items"]] == ["p1", "p2"]
+    assert result["headers"] == {"x-request": wanted}
@@ -0,0 +1,57 @@
+import sqlite3
+import sys
+
+import config
+import notification
+import replay
+from capture import CaptureWriter
+from product import Product
+from subscriptions import subscription_store
+
+
+def _write_capture(path):
+    writer = CaptureWriter(path)
+    for available in (0, 1):
+        item = Product.from_dict(
+            {
+                "_id": "p1",
+                "name": "Whey Protein",
+                "alias": "whey-protein",
+                "available": available,
+                "inventory_quantity": 4 * available,
+            }
+        )
+        writer.write("api", "110001", ["protein"], [item])
+    writer.close()
+
+
+def test_replay_keeps_subscriptions_and_email_out_of_the_live_paths(tmp_path, monkeypatch):
+    live_db = tmp_path / "live.db"
+    replay_db = tmp_path / "replay.db"
+    capture = tmp_path / "capture.jsonl.gz"
+    _write_capture(str(capture))
+
+    monkeypatch.setattr(config, "DB_PATH", str(live_db))
+    monkeypatch.setattr(subscription_store, "_loaded", False)
+    queue = notification.notification_queue
+    monkeypatch.setattr(queue, "outbox", notification.Outbox(str(tmp_path / "outbox")))
+
+    def refuse(msg):
+        raise OSError("no SMTP server in tests")
+
+    monkeypatch.setattr(queue._connection, "send", refuse)
+    monkeypatch.setattr(notification, "EMAIL_FROM", "bot@example.com")
+    monkeypatch.setattr(notification, "EMAIL_PASSWORD", "secret")
+    monkeypatch.setattr(notification, "EMAIL_TO", ["alerts@example.com"])
+    monkeypatch.setattr(
+        sys, "argv", ["replay.py", str(capture), "--db", str(replay_db), "--notify"]
+    )
+
+    replay.main()
+
+    assert not live_db.exists()
+    with sqlite3.connect(replay_db) as conn:
+        conn.execute("SELECT COUNT(*) FROM subscriptions").fetchone()
+    assert not (tmp_path / "outbox").exists()
+    pending = notification.Outbox(f"{replay_db}.outbox").pending()
+    assert [message["to"] for message in pending] == [["alerts@example.com"]]
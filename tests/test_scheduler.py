@@ -0,0 +1,41 @@
+import time
+
+from scheduler import AdaptiveScheduler
+
+TARGET = ("110001", "protein")
+
+
+def _hot_scheduler():
+    scheduler = AdaptiveScheduler(
+        [TARGET], base_interval=600, min_interval=60, max_interval=1800
+    )
+    # Restock on every poll until the target sits at the minimum interval
+    for _ in range(20):
+        scheduler.record_success(TARGET, changed=1, restocked=1)
+    schedule = scheduler.schedules[TARGET]
+    assert schedule.is_hot and schedule.interval == 60
+    return scheduler
+
+
+def test_error_on_hot_target_backs_off_from_its_interval():
+    scheduler = _hot_scheduler()
+
+    before = time.monotonic()
+    delay = scheduler.record_error(TARGET)
+
+    assert delay == 60
+    assert scheduler.schedules[TARGET].next_run - before < 120
+    assert scheduler.record_error(TARGET) == 120
+    assert scheduler.record_error(TARGET) == 240
+
+
+def test_error_backoff_is_capped_at_max_interval():
+    scheduler = _hot_scheduler()
+    delays = [scheduler.record_error(TARGET) for _ in range(10)]
+    assert delays[-1] == 1800
+
+
+def test_success_after_errors_keeps_the_hot_interval():
+    scheduler = _hot_scheduler()
+    scheduler.record_error(TARGET)
+    assert scheduler.record_success(TARGET, changed=1, restocked=1) == 60
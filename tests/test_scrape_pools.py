@@ -0,0 +1,24 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from browser_pool import BrowserPool
+from scrape_workers import ScrapeWorkerPool
+
+
+def _job(context):
+    return "done"
+
+
+@pytest.mark.parametrize("pool_class", [BrowserPool, ScrapeWorkerPool])
+def test_timed_out_wait_drops_the_queued_job(pool_class, monkeypatch):
+    pool = pool_class(size=1)
+    # No workers, so the job stays queued past the caller's timeout
+    monkeypatch.setattr(pool, "_start_workers", lambda: None)
+
+    with pytest.raises(FutureTimeoutError):
+        pool.run(_job, timeout=0.01)
+
+    future, fn, args = pool._jobs.get_nowait()
+    assert future.cancelled()
+    assert not future.set_running_or_notify_cancel()
@@ -0,0 +1,31 @@
+from concurrent.futures import Future
+
+from session_pool import SessionHarvester, get_session_pool
+
+
+def test_harvester_tops_up_emptiest_pools_first_and_skips_refusals():
+    warm, cold = "700001", "700002"
+    get_session_pool(warm).add(
+        {"user-agent": "tests"}, [{"name": "pincode", "value": warm, "expires": -1}]
+    )
+    get_session_pool(cold)
+    started = []
+    pending = Future()
+
+    def harvest(pincode):
+        # Only one slot: the first pincode gets it, the rest are refused
+        if started:
+            return None
+        started.append(pincode)
+        return pending
+
+    harvester = SessionHarvester([warm, cold], harvest, interval=60, startup_delay=0)
+    harvester._check_pools()
+    assert started == [cold]
+
+    # Still in flight, so it is not started again
+    harvester._check_pools()
+    assert started == [cold]
+
+    pending.set_result(None)
+    assert harvester._wake.is_set()
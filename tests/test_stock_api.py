@@ -0,0 +1,48 @@
+import itertools
+
+import db
+import stock_api
+from stock_api import SnapshotStore
+
+
+def test_other_pincode_write_leaves_etag_and_body_unchanged(monkeypatch):
+    clock = itertools.count(1_700_000_000)
+    monkeypatch.setattr(stock_api.time, "time", lambda: float(next(clock)))
+    store = SnapshotStore()
+    store.load([("110001", "p1", "Whey", 5, 1), ("560001", "p2", "Lassi", 0, 0)])
+    etag, body = store.current().response(store.etag_prefix, pincode="110001")
+
+    store.apply([("560001", "p2", "Lassi", 3, 1, True, False)])
+
+    assert store.current().response(store.etag_prefix, pincode="110001") == (etag, body)
+    other_etag, _ = store.current().response(store.etag_prefix, pincode="560001")
+    assert other_etag != etag
+
+
+def test_unfiltered_response_changes_with_any_write():
+    store = SnapshotStore()
+    store.load([("110001", "p1", "Whey", 5, 1)])
+    etag, _ = store.current().response(store.etag_prefix)
+    store.apply([("560001", "p2", "Lassi", 3, 1, True, False)])
+    assert store.current().response(store.etag_prefix)[0] != etag
+
+
+def test_handover_refresh_reloads_the_snapshot(fresh_db, monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(db, "stock_snapshot", store)
+    store.load([("110001", "p1", "Whey", 0, 0)])
+    # Stands in for a write made by another instance
+    fresh_db.write_changes([("110001", "p1", "Whey", 5, 1, True, False)])
+    store.load([("110001", "p1", "Whey", 0, 0)])
+
+    fresh_db.refresh_stock_cache("110001")
+
+    assert store.current().items(pincode="110001") == [
+        {
+            "pincode": "110001",
+            "product_id": "p1",
+            "name": "Whey",
+            "quantity": 5,
+            "available": True,
+        }
+    ]
@@ -0,0 +1,28 @@
+import sqlite3
+
+from subscriptions import SubscriptionStore
+
+RESTOCK = {"pincode": "110001", "product_id": "p1", "name": "Whey", "quantity": 5}
+
+
+def test_same_address_in_different_case_gets_one_digest(tmp_path):
+    store = SubscriptionStore(str(tmp_path / "subs.db"))
+    store.add("a@x.com", "110001")
+
+    digests = store.route([RESTOCK], default_recipients=[" A@X.com"])
+
+    assert list(digests) == ["a@x.com"]
+    assert digests["a@x.com"] == [RESTOCK]
+
+
+def test_rows_stored_with_mixed_case_are_normalized_on_load(tmp_path):
+    path = str(tmp_path / "subs.db")
+    SubscriptionStore(path).load()
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO subscriptions VALUES ('B@X.com ', '110001', 'p1')")
+
+    store = SubscriptionStore(path)
+    assert list(store.route([RESTOCK], default_recipients=["b@x.com"])) == ["b@x.com"]
+
+    store.remove("b@x.com", "110001", "p1")
+    assert SubscriptionStore(path).route([RESTOCK]) == {}